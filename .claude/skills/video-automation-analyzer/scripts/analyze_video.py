@@ -14,12 +14,19 @@ Examples:
 
     # Higher frame rate
     python scripts/analyze_video.py recording.mp4 --fps 2.0
+
+    # Limit parallel Claude requests and frames per request
+    python scripts/analyze_video.py recording.mp4 --concurrency 4 --batch-size 4
 """
 import sys
 import argparse
 import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
 from pathlib import Path
-import json
+from typing import List
 import subprocess
 
 # Add src to path (robust handling)
@@ -37,7 +44,10 @@ if not SRC_DIR.exists():
 if str(SRC_DIR) not in sys.path:
     sys.path.insert(0, str(SRC_DIR))
 
-from video_analyzer import VideoProcessor, ClaudeAnalyzer, ScriptGenerator
+from pydantic import TypeAdapter
+
+from video_analyzer import VideoProcessor, ClaudeAnalyzer, ScriptGenerator, FrameAnalysis
+from video_analyzer.claude_analyzer import CONTEXT_WINDOW
 
 # Optional progress indicator
 try:
@@ -47,6 +57,191 @@ except ImportError:
     TQDM_AVAILABLE = False
 
 
+# Optional async file I/O
+try:
+    import aiofiles
+    AIOFILES_AVAILABLE = True
+except ImportError:
+    AIOFILES_AVAILABLE = False
+
+
+# Encoded frames buffered between extraction and analysis
+FRAME_BUFFER_SIZE = 16
+
+# Serializes analyses.json straight to bytes in pydantic-core, with no dicts in between
+ANALYSES_ADAPTER = TypeAdapter(List[FrameAnalysis])
+
+# Output format -> (label, file name, ScriptGenerator method)
+SCRIPT_FORMATS = {
+    "playwright": ("Playwright script", "workflow_playwright.js", "generate_playwright"),
+    "selenium": ("Selenium script", "workflow_selenium.py", "generate_selenium"),
+    "windows-mcp": ("Windows-MCP script", "workflow_windows_mcp.yml", "generate_windows_mcp"),
+    "manual": ("manual steps", "manual_steps.md", "generate_manual_steps"),
+}
+
+# Frames whose dHashes differ by fewer bits reuse an earlier frame's analysis
+DEDUP_MAX_DISTANCE = 5
+
+# Most recent analyzed frames compared by dHash (exact repeats are always found)
+DEDUP_WINDOW = 64
+
+
+def fingerprint_frame(processor, item):
+    """Return (timestamp, frame, exact digest, perceptual hash) for a decoded frame."""
+    timestamp, frame = item
+    # Hash the decoded (C-contiguous) array's buffer in place, without a copy
+    digest = hashlib.blake2b(memoryview(frame), digest_size=16).digest()
+    return timestamp, frame, digest, processor.frame_hash(frame)
+
+
+async def write_output(path, content):
+    """Write text (as UTF-8) or bytes to a file without blocking the event loop."""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+
+    if AIOFILES_AVAILABLE:
+        async with aiofiles.open(path, "wb") as f:
+            await f.write(content)
+    else:
+        await asyncio.to_thread(path.write_bytes, content)
+
+
+async def analyze_video_frames(processor, analyzer, video_path, args):
+    """
+    Decode, encode and analyze frames as a producer/consumer pipeline.
+
+    A producer pulls key frames off the decoder and hands each one to a pool of
+    encoder threads (OpenCV and libjpeg release the GIL), so the frames of a batch
+    are JPEG/base64-encoded in parallel while decoding continues. Encoded batches
+    are queued for --concurrency consumers that send them to Claude. Decoding and
+    encoding therefore overlap with network latency, and the bounded queue caps
+    how many encoded frames sit in memory.
+
+    Unless --no-dedup is given, a frame that is byte-identical or perceptually
+    near-identical to an earlier one is not sent; it gets a copy of that frame's
+    analysis with its own timestamp once analysis finishes.
+
+    Returns:
+        List of FrameAnalysis objects in video order
+    """
+    queue = asyncio.Queue(maxsize=max(1, FRAME_BUFFER_SIZE // args.batch_size))
+    analyses = []
+    duplicates = []  # (index, source index, timestamp) of frames not sent to Claude
+    completed = 0
+
+    # Create progress indicator
+    progress = None
+    if TQDM_AVAILABLE:
+        # Use tqdm progress bar (total unknown while decoding)
+        progress = tqdm(desc="Analyzing frames", unit="frame")
+
+    loop = asyncio.get_running_loop()
+    encode_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+
+    async def producer():
+        frame_iter = processor.iter_key_frames(str(video_path))
+        pending = []  # (index, timestamp, encode future) for the batch being assembled
+        seen_digests = {}  # exact frame digest -> index of first frame with it
+        # (perceptual hash, index) of the latest frames sent to Claude
+        seen_hashes = deque(maxlen=DEDUP_WINDOW)
+
+        def next_frame():
+            item = next(frame_iter, None)
+            if item is None:
+                return None
+            if args.no_dedup:
+                # Fingerprints are only needed to find duplicates
+                return (*item, None, None)
+            return fingerprint_frame(processor, item)
+
+        async def flush():
+            encoded = await asyncio.gather(*(future for _, _, future in pending))
+            batch = [(timestamp, frame_base64) for (_, timestamp, _), frame_base64 in zip(pending, encoded)]
+            await queue.put(([index for index, _, _ in pending], batch))
+            pending.clear()
+
+        try:
+            while True:
+                item = await asyncio.to_thread(next_frame)
+                if item is None:
+                    break
+
+                timestamp, frame, digest, phash = item
+                index = len(analyses)
+                analyses.append(None)
+
+                if not args.no_dedup:
+                    source = seen_digests.get(digest)
+                    if source is None:
+                        # Newest first: a near-duplicate is most likely a recent frame
+                        source = next((i for h, i in reversed(seen_hashes)
+                                       if (h ^ phash).bit_count() < DEDUP_MAX_DISTANCE), None)
+                    if source is not None:
+                        duplicates.append((index, source, timestamp))
+                        continue
+                    seen_digests[digest] = index
+                    seen_hashes.append((phash, index))
+
+                future = loop.run_in_executor(encode_pool, processor.frame_to_base64, frame)
+                pending.append((index, timestamp, future))
+
+                if len(pending) == args.batch_size:
+                    await flush()
+
+            if pending:
+                await flush()
+        finally:
+            # Always release the consumers, even if decoding failed
+            for _ in range(args.concurrency):
+                await queue.put(None)
+
+    async def consumer():
+        nonlocal completed
+
+        while (item := await queue.get()) is not None:
+            indices, batch = item
+            if args.verbose:
+                print(f"  Analyzing frames {indices[0]+1}-{indices[-1]+1} "
+                      f"@ {batch[0][0]}-{batch[-1][0]}ms...")
+
+            # Batches run concurrently, so context is the latest earlier frames
+            # that have already finished (all of them when --concurrency is 1)
+            context = []
+            for index in range(indices[0] - 1, -1, -1):
+                if len(context) == CONTEXT_WINDOW:
+                    break
+                if analyses[index] is not None:
+                    context.append(analyses[index])
+            context.reverse()
+            results = await analyzer.analyze_frames_batch(batch, context)
+            for index, analysis in zip(indices, results):
+                analyses[index] = analysis
+
+            completed += len(batch)
+            if progress is not None:
+                progress.update(len(batch))
+            elif not args.verbose:
+                print(f"Progress: {completed} frames analyzed", end='\r')
+
+    try:
+        await asyncio.gather(producer(), *(consumer() for _ in range(args.concurrency)))
+    finally:
+        encode_pool.shutdown(wait=False, cancel_futures=True)
+        if progress is not None:
+            progress.close()
+        elif not args.verbose:
+            # Clear progress line if using simple indicator
+            print(" " * 80, end='\r')
+
+    for index, source, timestamp in duplicates:
+        analyses[index] = analyses[source].model_copy(update={"timestamp": timestamp})
+
+    if duplicates and args.verbose:
+        print(f"  Reused analyses for {len(duplicates)} duplicate frames")
+
+    return analyses
+
+
 async def main():
     """Main CLI entry point."""
     parser = argparse.ArgumentParser(
@@ -64,7 +259,7 @@ async def main():
     parser.add_argument(
         "--formats",
         nargs="+",
-        choices=["playwright", "selenium", "windows-mcp", "manual"],
+        choices=list(SCRIPT_FORMATS),
         default=["playwright", "manual"],
         help="Output formats to generate"
     )
@@ -74,6 +269,56 @@ async def main():
         default=1.0,
         help="Frames per second to sample (default: 1.0)"
     )
+    parser.add_argument(
+        "--keyframes-only",
+        action="store_true",
+        help="Decode only the video's keyframes (much faster; timestamps snap to keyframes)"
+    )
+    parser.add_argument(
+        "--change-metric",
+        choices=["pixel", "dhash"],
+        default="pixel",
+        help="How frames are compared to detect changes: changed pixels or perceptual hash (default: pixel)"
+    )
+    parser.add_argument(
+        "--max-image-dim",
+        type=int,
+        default=1280,
+        help="Downscale frames sent to Claude to this many pixels on the long side (default: 1280)"
+    )
+    parser.add_argument(
+        "--jpeg-quality",
+        type=int,
+        default=75,
+        help="JPEG quality of frames sent to Claude, 1-100 (default: 75)"
+    )
+    parser.add_argument(
+        "--frame-model",
+        default="haiku",
+        help="Claude model for per-frame analysis (default: haiku)"
+    )
+    parser.add_argument(
+        "--summary-model",
+        default="sonnet",
+        help="Claude model for the workflow summary (default: sonnet)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Maximum number of Claude requests in flight (default: 8)"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=8,
+        help="Frames sent to Claude per request (default: 8)"
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="Send every key frame to Claude, even near-duplicates of earlier frames"
+    )
     parser.add_argument(
         "--verbose",
         action="store_true",
@@ -82,6 +327,15 @@ async def main():
 
     args = parser.parse_args()
 
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    if args.max_image_dim < 1:
+        parser.error("--max-image-dim must be at least 1")
+    if not 1 <= args.jpeg_quality <= 100:
+        parser.error("--jpeg-quality must be between 1 and 100")
+
     # Check FFmpeg availability before processing
     try:
         subprocess.run(
@@ -115,14 +369,27 @@ async def main():
     print(f"Settings: {args.fps} fps, formats: {', '.join(args.formats)}")
     print()
 
+    analyzer = None
     try:
-        # 1. Extract frames
-        print("Extracting frames...")
-        processor = VideoProcessor(fps_sample=args.fps)
-        frames = processor.extract_key_frames(str(video_path))
+        # 1-2. Extract frames and analyze them as they are decoded
+        print("Extracting and analyzing frames with Claude Vision...")
+        processor = VideoProcessor(
+            fps_sample=args.fps,
+            keyframes_only=args.keyframes_only,
+            change_metric=args.change_metric,
+            max_image_dim=args.max_image_dim,
+            jpeg_quality=args.jpeg_quality
+        )
+        analyzer = ClaudeAnalyzer(
+            max_concurrency=args.concurrency,
+            frame_model=args.frame_model,
+            summary_model=args.summary_model,
+            max_batch_size=args.batch_size
+        )
+        analyses = await analyze_video_frames(processor, analyzer, video_path, args)
 
         # Validate frame extraction
-        if not frames:
+        if not analyses:
             print("Error: No frames could be extracted from video.", file=sys.stderr)
             print("Possible causes:", file=sys.stderr)
             print("  - Video file is corrupted", file=sys.stderr)
@@ -130,95 +397,39 @@ async def main():
             print("  - Video is too short (< 1 second)", file=sys.stderr)
             sys.exit(1)
 
-        if len(frames) < 3:
-            print(f"Warning: Only {len(frames)} frames extracted. Analysis may be incomplete.", file=sys.stderr)
+        if len(analyses) < 3:
+            print(f"Warning: Only {len(analyses)} frames extracted. Analysis may be incomplete.", file=sys.stderr)
 
-        print(f"Extracted {len(frames)} key frames")
+        print(f"Analyzed {len(analyses)} key frames")
 
-        # 2. Analyze frames
-        print("\nAnalyzing frames with Claude Vision...")
-        analyzer = ClaudeAnalyzer()
-        analyses = []
-        context = []
-
-        # Create progress indicator
-        total_frames = len(frames)
-        if TQDM_AVAILABLE:
-            # Use tqdm progress bar
-            frame_iterator = tqdm(enumerate(frames), total=total_frames, desc="Analyzing frames", unit="frame")
-        else:
-            frame_iterator = enumerate(frames)
-
-        for i, (timestamp, frame) in frame_iterator:
-            if args.verbose:
-                print(f"  Analyzing frame {i+1}/{total_frames} @ {timestamp}ms...")
-            elif not TQDM_AVAILABLE and i % 5 == 0:
-                # Simple percentage indicator (every 5 frames)
-                percentage = (i / total_frames) * 100
-                print(f"Progress: {percentage:.1f}% ({i}/{total_frames} frames)", end='\r')
-
-            frame_base64 = processor.frame_to_base64(frame)
-            analysis = await analyzer.analyze_frame(frame_base64, timestamp, context)
-
-            analyses.append(analysis)
-            context.append(analysis)
-
-        # Clear progress line if using percentage indicator
-        if not TQDM_AVAILABLE and not args.verbose:
-            print(" " * 80, end='\r')  # Clear the line
-
-        print(f"Analyzed {len(analyses)} frames")
-
-        # 3. Generate workflow summary
-        print("\nGenerating workflow summary...")
-        summary = await analyzer.generate_workflow_summary(analyses)
-
-        # 4. Generate scripts
-        print("\nGenerating automation scripts...")
+        # 3-4. Generate the workflow summary and the scripts. Scripts only need the
+        # analyses, so they render in worker threads while Claude writes the summary,
+        # and every file is written as soon as its content is ready.
+        print("\nGenerating workflow summary and automation scripts...")
         generator = ScriptGenerator()
+        workflow_name = video_path.stem
 
-        # Save analyses
-        analyses_file = output_dir / "analyses.json"
-        with open(analyses_file, "w", encoding="utf-8") as f:
-            json.dump([a.model_dump() for a in analyses], f, indent=2)
-        print(f"  Saved analyses to {analyses_file}")
+        async def summary_markdown():
+            summary = await analyzer.generate_workflow_summary(analyses)
+            return f"# Workflow Summary\n\n{summary}\n"
 
-        # Save summary
-        summary_file = output_dir / "summary.md"
-        with open(summary_file, "w", encoding="utf-8") as f:
-            f.write(f"# Workflow Summary\n\n{summary}\n")
-        print(f"  Saved summary to {summary_file}")
+        outputs = [
+            ("analyses", output_dir / "analyses.json",
+             asyncio.to_thread(ANALYSES_ADAPTER.dump_json, analyses, indent=2)),
+            ("summary", output_dir / "summary.md", summary_markdown()),
+        ]
+        for fmt, (label, filename, method) in SCRIPT_FORMATS.items():
+            if fmt in args.formats:
+                render = getattr(generator, method)
+                outputs.append((label, output_dir / filename,
+                                asyncio.to_thread(render, analyses, workflow_name)))
 
-        # Generate requested formats
-        workflow_name = video_path.stem
+        async def save(path, content):
+            await write_output(path, await content)
 
-        if "playwright" in args.formats:
-            script = generator.generate_playwright(analyses, workflow_name)
-            script_file = output_dir / "workflow_playwright.js"
-            with open(script_file, "w", encoding="utf-8") as f:
-                f.write(script)
-            print(f"  Saved Playwright script to {script_file}")
-
-        if "selenium" in args.formats:
-            script = generator.generate_selenium(analyses, workflow_name)
-            script_file = output_dir / "workflow_selenium.py"
-            with open(script_file, "w", encoding="utf-8") as f:
-                f.write(script)
-            print(f"  Saved Selenium script to {script_file}")
-
-        if "windows-mcp" in args.formats:
-            script = generator.generate_windows_mcp(analyses, workflow_name)
-            script_file = output_dir / "workflow_windows_mcp.yml"
-            with open(script_file, "w", encoding="utf-8") as f:
-                f.write(script)
-            print(f"  Saved Windows-MCP script to {script_file}")
-
-        if "manual" in args.formats:
-            steps = generator.generate_manual_steps(analyses, workflow_name)
-            steps_file = output_dir / "manual_steps.md"
-            with open(steps_file, "w", encoding="utf-8") as f:
-                f.write(steps)
-            print(f"  Saved manual steps to {steps_file}")
+        await asyncio.gather(*(save(path, content) for _, path, content in outputs))
+        for label, path, _ in outputs:
+            print(f"  Saved {label} to {path}")
 
         print(f"\nAnalysis complete! Results in: {output_dir}")
 
@@ -228,6 +439,9 @@ async def main():
             import traceback
             traceback.print_exc()
         sys.exit(1)
+    finally:
+        if analyzer is not None:
+            await analyzer.close()
 
 
 if __name__ == "__main__":
@@ -11,7 +11,7 @@ Verifies:
 import sys
 import subprocess
 from pathlib import Path
-import importlib
+import importlib.util
 
 sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
@@ -28,13 +28,12 @@ def check_python_version():
 
 
 def check_package(package_name: str, import_name: str = None) -> bool:
-    """Check if package is installed."""
+    """Check if package is installed (without importing it)."""
     import_name = import_name or package_name
-    try:
-        importlib.import_module(import_name)
+    if importlib.util.find_spec(import_name) is not None:
         print(f"{package_name} installed")
         return True
-    except ImportError:
+    else:
         print(f"{package_name} not installed")
         return False
 
@@ -77,7 +76,6 @@ def main():
         ("anthropic", lambda: check_package("anthropic")),
         ("mcp", lambda: check_package("mcp")),
         ("opencv-python", lambda: check_package("opencv-python", "cv2")),
-        ("pillow", lambda: check_package("pillow", "PIL")),
         ("pydantic", lambda: check_package("pydantic")),
         ("jinja2", lambda: check_package("jinja2")),
         ("FFmpeg", check_ffmpeg),
@@ -9,11 +9,47 @@ Checks:
 """
 import sys
 import argparse
+from functools import lru_cache
 from pathlib import Path
+import shutil
 import subprocess
 import re
 
 
+# Everything each validator looks for, as one alternation scanned in a single pass
+PLAYWRIGHT_CHECKS = re.compile(
+    r"(?P<empty_click>page\.click\((?:''|\"\"|``)\))"
+    r"|(?P<empty_fill>page\.fill\((?:''|\"\"|``)\))"
+    r"|(?P<wait>await page\.waitForTimeout\()"
+    r"|(?P<try>try \{)"
+)
+
+SELENIUM_CHECKS = re.compile(
+    r"(?P<empty_selector>driver\.find_element\(By\.CSS_SELECTOR, \"\"\))"
+    r"|(?P<sleep>time\.sleep)"
+    r"|(?P<explicit_wait>WebDriverWait)"
+    r"|(?P<try>try:)"
+    r"|(?P<except>except)"
+)
+
+
+def scan(checks: re.Pattern, content: str) -> set[str]:
+    """Return the names of the groups in ``checks`` that match anywhere in ``content``."""
+    found: set[str] = set()
+    for match in checks.finditer(content):
+        if match.lastgroup:
+            found.add(match.lastgroup)
+        if len(found) == len(checks.groupindex):
+            break
+    return found
+
+
+@lru_cache(maxsize=None)
+def node_available() -> bool:
+    """Whether Node.js is on PATH (looked up once per process)."""
+    return shutil.which("node") is not None
+
+
 def validate_playwright(script_path: Path) -> tuple[bool, list[str]]:
     """Validate Playwright JavaScript script."""
     issues = []
@@ -22,7 +58,7 @@ def validate_playwright(script_path: Path) -> tuple[bool, list[str]]:
         content = f.read()
 
     # Check syntax with Node.js
-    try:
+    if node_available():
         result = subprocess.run(
             ["node", "--check", str(script_path)],
             capture_output=True,
@@ -30,21 +66,23 @@ def validate_playwright(script_path: Path) -> tuple[bool, list[str]]:
         )
         if result.returncode != 0:
             issues.append(f"Syntax error: {result.stderr}")
-    except FileNotFoundError:
+    else:
         issues.append("Node.js not installed (cannot verify syntax)")
 
+    found = scan(PLAYWRIGHT_CHECKS, content)
+
     # Check for common issues
-    if "page.click('')" in content or 'page.click("")' in content:
+    if "empty_click" in found:
         issues.append("Empty selector in page.click()")
 
-    if "page.fill('')" in content or 'page.fill("")' in content:
+    if "empty_fill" in found:
         issues.append("Empty selector in page.fill()")
 
     # Check for best practices
-    if "await page.waitForTimeout(" not in content:
+    if "wait" not in found:
         issues.append("Warning: No wait times found (may cause flakiness)")
 
-    if "try {" not in content:
+    if "try" not in found:
         issues.append("Warning: No error handling found")
 
     return len(issues) == 0, issues
@@ -57,27 +95,25 @@ def validate_selenium(script_path: Path) -> tuple[bool, list[str]]:
     with open(script_path) as f:
         content = f.read()
 
-    # Check syntax with Python
+    # Check syntax in-process (no interpreter spawn)
     try:
-        result = subprocess.run(
-            [sys.executable, "-m", "py_compile", str(script_path)],
-            capture_output=True,
-            text=True
-        )
-        if result.returncode != 0:
-            issues.append(f"Syntax error: {result.stderr}")
-    except Exception as e:
+        compile(content, str(script_path), "exec")
+    except SyntaxError as e:
+        issues.append(f"Syntax error: {e}")
+    except ValueError as e:
         issues.append(f"Python syntax check failed: {e}")
 
+    found = scan(SELENIUM_CHECKS, content)
+
     # Check for common issues
-    if 'driver.find_element(By.CSS_SELECTOR, "")' in content:
+    if "empty_selector" in found:
         issues.append("Empty selector in find_element()")
 
     # Check for best practices
-    if "time.sleep" not in content and "WebDriverWait" not in content:
+    if "sleep" not in found and "explicit_wait" not in found:
         issues.append("Warning: No wait mechanism found")
 
-    if "try:" not in content and "except" not in content:
+    if "try" not in found and "except" not in found:
         issues.append("Warning: No error handling found")
 
     return len(issues) == 0, issues
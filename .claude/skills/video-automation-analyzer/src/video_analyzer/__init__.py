@@ -1,11 +1,25 @@
 """Video Automation Analyzer - Analyze screen recordings to generate automation scripts."""
+import importlib
+from typing import TYPE_CHECKING
 
 __version__ = "0.1.0"
 
-from .video_processor import VideoProcessor
-from .claude_analyzer import ClaudeAnalyzer
-from .script_generator import ScriptGenerator
-from .models import FrameAnalysis, TargetElement, WorkflowSummary
+# Public names and the submodule defining each. Submodules are imported on first
+# attribute access, so e.g. using the models does not load OpenCV or the Agent SDK.
+_EXPORTS = {
+    "VideoProcessor": ".video_processor",
+    "ClaudeAnalyzer": ".claude_analyzer",
+    "ScriptGenerator": ".script_generator",
+    "FrameAnalysis": ".models",
+    "TargetElement": ".models",
+    "WorkflowSummary": ".models",
+}
+
+if TYPE_CHECKING:
+    from .video_processor import VideoProcessor
+    from .claude_analyzer import ClaudeAnalyzer
+    from .script_generator import ScriptGenerator
+    from .models import FrameAnalysis, TargetElement, WorkflowSummary
 
 __all__ = [
     "VideoProcessor",
@@ -15,3 +29,17 @@ __all__ = [
     "TargetElement",
     "WorkflowSummary",
 ]
+
+
+def __getattr__(name: str):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value  # cache so later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,45 +1,373 @@
 """Claude Vision analysis using Agent SDK (no API key required)."""
-from claude_agent_sdk import ClaudeSDKClient, ClaudeAgentOptions, AssistantMessage, TextBlock, ResultMessage
-from typing import List, Optional
+from claude_agent_sdk import (
+    ClaudeSDKClient, ClaudeAgentOptions, AssistantMessage, TextBlock, ResultMessage,
+    CLIConnectionError, ProcessError
+)
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
 import asyncio
+import hashlib
 import json
-import tempfile
-from pathlib import Path
-import cv2
-from .models import FrameAnalysis
+import random
+import re
+from pydantic_core import from_json
+from .models import ANALYSIS_FAILED_PREFIX, SUMMARY_FAILED_PREFIX, FrameAnalysis
+
+# Markdown code fence around a JSON reply
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.S)
+
+_JSON_DECODER = json.JSONDecoder()
+_CLOSERS = {"{": "}", "[": "]"}
+
+# Number of preceding frame analyses described to Claude as context
+CONTEXT_WINDOW = 3
+
+# Output token budgets. A frame analysis is a small fixed-shape JSON object, so
+# frame requests get a tight per-frame cap; only the summary needs more room.
+FRAME_MAX_TOKENS = 400
+SUMMARY_MAX_TOKENS = 1500
+
+# Retries for rate limits, server errors and dropped connections, with full-jitter
+# exponential backoff between attempts
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+# Assistant message errors / result HTTP statuses worth retrying
+_RETRYABLE_MESSAGE_ERRORS = {"rate_limit", "server_error"}
+_RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+
+# Frame analyses remembered per analyzer, keyed by screenshot, so identical
+# screenshots (idle screens) are not sent to Claude again
+ANALYSIS_CACHE_SIZE = 128
+
+# Errors after which the SDK client's process is unusable
+_CONNECTION_ERRORS = (CLIConnectionError, ProcessError)
+
+
+class _RetryableError(RuntimeError):
+    """Claude reported a transient failure (rate limit, overload)."""
+
+
+# Questions asked about every analyzed frame
+ANALYSIS_QUESTIONS = """1. What action is being performed?
+2. Which UI element is targeted?
+3. Any input value being entered
+4. Current URL or application
+5. Brief description"""
+
+# JSON shape Claude must return for each analyzed frame
+FRAME_JSON_FORMAT = """{
+    "action_type": "click|type|navigate|scroll|select",
+    "target_element": {
+        "type": "button|input|link|dropdown",
+        "text": "visible text",
+        "selector": "best guess CSS selector",
+        "location": {"x": 0, "y": 0}
+    },
+    "input_value": "value if typing or empty string",
+    "url": "current url or empty string",
+    "description": "brief action description"
+}"""
+
+# Static instructions for frame analysis. They are identical for every request, so
+# they go in the system prompt, which Claude Code sends as a cacheable prefix;
+# per-frame prompts then only carry the screenshot paths, timestamps and context.
+FRAME_SYSTEM_PROMPT = f"""You analyze screenshots from screen recordings to extract automation workflows.
+
+For each screenshot identify:
+{ANALYSIS_QUESTIONS}
+
+Respond ONLY with valid JSON (no markdown, no code blocks). Describe each screenshot
+with an object in this exact format:
+{FRAME_JSON_FORMAT}
+
+When given several screenshots, respond with a JSON array holding one such object per
+screenshot, in the order listed."""
 
 
 class ClaudeAnalyzer:
-    """Analyze video frames using Claude Agent SDK."""
+    """
+    Analyze video frames using Claude Agent SDK.
 
-    def __init__(self):
-        """Initialize Claude analyzer with Agent SDK."""
-        self.model = "sonnet"  # Agent SDK model name
-        self.temp_dir = None
-        self.client = None
+    SDK clients are connected lazily and then kept for reuse across calls and
+    whole-video runs. Call ``close()`` or use the analyzer as an async context
+    manager when done with it.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 1,
+        frame_model: str = "haiku",
+        summary_model: str = "sonnet",
+        max_batch_size: int = 8
+    ):
+        """
+        Initialize Claude analyzer with Agent SDK.
+
+        Args:
+            max_concurrency: Maximum number of SDK clients kept connected, i.e. how
+                many analyses can be in flight at once (default: 1)
+            frame_model: Agent SDK model name for per-frame analysis (default: "haiku")
+            summary_model: Agent SDK model name for the workflow summary (default: "sonnet")
+            max_batch_size: Most frames sent in one request; larger batches are split.
+                Frame replies are capped at FRAME_MAX_TOKENS per frame (default: 8)
+        """
+        self.frame_model = frame_model
+        self.summary_model = summary_model
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_batch_size = max(1, max_batch_size)
+        self.client: Optional[ClaudeSDKClient] = None
+        self._clients: List[ClaudeSDKClient] = []
+        self._client_count = 0
+        self._idle_clients: "asyncio.Queue[ClaudeSDKClient]" = asyncio.Queue()
+        self.summary_client: Optional[ClaudeSDKClient] = None
+        self._analysis_cache: "OrderedDict[bytes, FrameAnalysis]" = OrderedDict()
+
+    async def _new_client(
+        self,
+        model: str,
+        max_tokens: int,
+        system_prompt: Optional[str] = None
+    ) -> ClaudeSDKClient:
+        """Create and connect a Claude SDK client."""
+        # Frames arrive inline in the prompt, so no tool definitions are sent
+        # and Claude answers in a single turn
+        options = ClaudeAgentOptions(
+            tools=[],
+            max_turns=1,
+            model=model,
+            system_prompt=system_prompt,
+            env={"CLAUDE_CODE_MAX_OUTPUT_TOKENS": str(max_tokens)}
+        )
+        client = ClaudeSDKClient(options=options)
+        await client.connect()
+        return client
+
+    async def _connect(self) -> ClaudeSDKClient:
+        """Connect a new frame-analysis client and register it with the pool."""
+        self._client_count += 1
+        try:
+            # One cap for every frame client, so any client can serve any batch;
+            # the cap is only a ceiling on the reply length
+            client = await self._new_client(
+                self.frame_model,
+                FRAME_MAX_TOKENS * self.max_batch_size,
+                FRAME_SYSTEM_PROMPT
+            )
+        except BaseException:
+            self._client_count -= 1
+            raise
+
+        self._clients.append(client)
+        return client
 
     async def _ensure_client(self):
         """Ensure Claude SDK client is initialized."""
         if self.client is None:
-            options = ClaudeAgentOptions(
-                allowed_tools=["Read"],
-                model=self.model,
-                permission_mode="bypassPermissions"
-            )
-            self.client = ClaudeSDKClient(options=options)
-            await self.client.connect()
+            self.client = await self._connect()
+            self._idle_clients.put_nowait(self.client)
+
+    @asynccontextmanager
+    async def _client_session(self) -> AsyncIterator[ClaudeSDKClient]:
+        """
+        Check out a client for one query/response exchange.
+
+        A single SDK client handles one conversation turn at a time, so concurrent
+        callers each get their own client. New clients are connected on demand up
+        to ``max_concurrency``; beyond that, callers wait for one to be released.
+        """
+        if self._idle_clients.empty() and self._client_count < self.max_concurrency:
+            client = await self._connect()
+            if self.client is None:
+                self.client = client
+        else:
+            client = await self._idle_clients.get()
+
+        broken = False
+        try:
+            yield client
+        except _CONNECTION_ERRORS:
+            broken = True
+            raise
+        finally:
+            if broken:
+                # Drop the dead client; a later session connects a fresh one
+                self._clients.remove(client)
+                self._client_count -= 1
+                if self.client is client:
+                    self.client = None
+                await self._disconnect_quietly(client)
+            else:
+                self._idle_clients.put_nowait(client)
+
+    async def _query(
+        self,
+        client: ClaudeSDKClient,
+        prompt: Union[str, List[Dict[str, Any]]]
+    ) -> str:
+        """
+        Send a prompt and collect the text of Claude's reply.
+
+        Args:
+            client: Connected SDK client
+            prompt: Plain text, or a list of content blocks (text and images)
+        """
+        if isinstance(prompt, str):
+            await client.query(prompt)
+        else:
+            async def messages():
+                yield {
+                    "type": "user",
+                    "message": {"role": "user", "content": prompt},
+                    "parent_tool_use_id": None
+                }
+
+            await client.query(messages())
+
+        chunks = []
+        error: Optional[str] = None
+        async for message in client.receive_response():
+            if isinstance(message, AssistantMessage):
+                # ``error`` is only reported by newer SDK versions
+                if getattr(message, "error", None) in _RETRYABLE_MESSAGE_ERRORS:
+                    error = message.error
+                for block in message.content:
+                    if isinstance(block, TextBlock):
+                        chunks.append(block.text)
+            elif isinstance(message, ResultMessage):
+                status = getattr(message, "api_error_status", None)
+                if message.is_error and status in _RETRYABLE_STATUS_CODES:
+                    error = error or f"HTTP {status}"
+                break
+
+        # Raise only after the reply is fully consumed, so the client stays usable
+        if error:
+            raise _RetryableError(f"Claude request failed: {error}")
+
+        return "".join(chunks)
+
+    async def _request(self, prompt: Union[str, List[Dict[str, Any]]], summary: bool = False) -> str:
+        """
+        Send a prompt on a pooled frame client (or the summary client) with retries.
+
+        Rate limits, server errors and dropped connections are retried up to
+        MAX_RETRIES times with exponential backoff and full jitter, so concurrent
+        requests do not retry in lockstep.
+        """
+        attempt = 0
+        while True:
+            try:
+                if summary:
+                    summary_client = await self._ensure_summary_client()
+                    try:
+                        return await self._query(summary_client, prompt)
+                    except _CONNECTION_ERRORS:
+                        self.summary_client = None
+                        await self._disconnect_quietly(summary_client)
+                        raise
+
+                async with self._client_session() as client:
+                    return await self._query(client, prompt)
+
+            except (_RetryableError, *_CONNECTION_ERRORS):
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+                await asyncio.sleep(random.uniform(0, delay))
+                attempt += 1
+
+    async def _disconnect_quietly(self, client: ClaudeSDKClient):
+        """Disconnect a client that may already be dead."""
+        try:
+            await client.disconnect()
+        except Exception:
+            pass
+
+    async def _ensure_summary_client(self) -> ClaudeSDKClient:
+        """Ensure the summary client (without the frame-analysis system prompt) is initialized."""
+        if self.summary_client is None:
+            self.summary_client = await self._new_client(self.summary_model, SUMMARY_MAX_TOKENS)
+        return self.summary_client
+
+    async def close(self):
+        """Disconnect all SDK clients. The analyzer reconnects if used again."""
+        await self._cleanup()
+
+    async def __aenter__(self) -> "ClaudeAnalyzer":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
 
     async def _cleanup(self):
         """Cleanup resources."""
-        if self.client:
-            await self.client.disconnect()
-            self.client = None
+        for client in self._clients:
+            await client.disconnect()
+
+        if self.summary_client:
+            await self.summary_client.disconnect()
+            self.summary_client = None
+
+        self._clients = []
+        self._client_count = 0
+        self._idle_clients = asyncio.Queue()
+        self.client = None
+
+    def _image_block(self, frame_base64: str) -> Dict[str, Any]:
+        """Wrap a base64 JPEG frame as an inline image content block."""
+        return {
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": "image/jpeg",
+                "data": frame_base64
+            }
+        }
+
+    def _build_context_text(self, previous_context: Optional[Sequence[FrameAnalysis]]) -> str:
+        """Describe the given previous actions for the prompt."""
+        context_text = ""
+        if previous_context and len(previous_context) > 0:
+            context_text = "\n\nPrevious actions:\n"
+            for ctx in previous_context:
+                context_text += f"- {ctx.description}\n"
+        return context_text
+
+    def _parse_json(self, response_text: str, opener: str = "{") -> Any:
+        """Parse the first JSON value from a reply, ignoring markdown fences and prose."""
+        # Extract JSON (handle markdown code blocks)
+        fence = _FENCE_RE.search(response_text)
+        body = fence.group(1) if fence else response_text
+
+        start_idx = body.find(opener)
+        if start_idx == -1:
+            raise ValueError(f"No JSON value starting with {opener!r} in response")
+
+        # Fast path: the reply is just the value, parsed by pydantic-core;
+        # otherwise decode from the opener and ignore trailing prose
+        end_idx = body.rfind(_CLOSERS[opener]) + 1
+        try:
+            return from_json(body[start_idx:end_idx])
+        except ValueError:
+            value, _ = _JSON_DECODER.raw_decode(body, start_idx)
+            return value
+
+    def _failed_analysis(self, timestamp: int, error: Exception) -> FrameAnalysis:
+        """Fallback on error (graceful degradation)."""
+        # Fields are known-good here, so skip validation
+        return FrameAnalysis.model_construct(
+            timestamp=timestamp,
+            action_type="unknown",
+            description=f"{ANALYSIS_FAILED_PREFIX}: {str(error)}"
+        )
 
     async def analyze_frame(
         self,
         frame_base64: str,
         timestamp: int,
-        previous_context: Optional[List[FrameAnalysis]] = None
+        previous_context: Optional[Sequence[FrameAnalysis]] = None
     ) -> FrameAnalysis:
         """
         Analyze single frame using Claude Agent SDK.
@@ -47,96 +375,128 @@ class ClaudeAnalyzer:
         Args:
             frame_base64: Base64-encoded frame image
             timestamp: Frame timestamp in milliseconds
-            previous_context: Previous frame analyses for context
+            previous_context: The last few (``CONTEXT_WINDOW``) frame analyses,
+                described to Claude as context
 
         Returns:
             FrameAnalysis object
         """
+        context_text = self._build_context_text(previous_context)
+
+        # A repeated screenshot reuses its earlier analysis; the context would
+        # only reword the description, and the timestamp is replaced anyway
+        cache_key = hashlib.blake2b(frame_base64.encode("ascii"), digest_size=16).digest()
+        cached = self._analysis_cache.get(cache_key)
+        if cached is not None:
+            self._analysis_cache.move_to_end(cache_key)
+            return cached.model_copy(update={"timestamp": timestamp})
+
         try:
-            # Ensure client is connected
-            await self._ensure_client()
-
-            # Create temp directory if needed
-            if self.temp_dir is None:
-                self.temp_dir = tempfile.mkdtemp(prefix="video_analysis_")
-
-            # Save frame to temporary file
-            import base64
-            frame_path = Path(self.temp_dir) / f"frame_{timestamp}.jpg"
-            frame_data = base64.b64decode(frame_base64)
-            frame_path.write_bytes(frame_data)
-
-            # Build context from previous frames
-            context_text = ""
-            if previous_context and len(previous_context) > 0:
-                context_text = "\n\nPrevious actions:\n"
-                for ctx in previous_context[-3:]:  # Last 3 actions
-                    context_text += f"- {ctx.description}\n"
-
-            prompt = f"""Analyze the screenshot at {frame_path}.
+            prompt = [
+                self._image_block(frame_base64),
+                {"type": "text", "text": f"""Analyze the attached screenshot.
 {context_text}
 
-Current timestamp: {timestamp}ms
+Current timestamp: {timestamp}ms"""}
+            ]
 
-Identify:
-1. What action is being performed?
-2. Which UI element is targeted?
-3. Any input value being entered
-4. Current URL or application
-5. Brief description
+            # Send query to Claude on a pooled client
+            response_text = await self._request(prompt)
 
-Respond ONLY with valid JSON in this exact format (no markdown, no code blocks):
-{{
-    "action_type": "click|type|navigate|scroll|select",
-    "target_element": {{
-        "type": "button|input|link|dropdown",
-        "text": "visible text",
-        "selector": "best guess CSS selector",
-        "location": {{"x": 0, "y": 0}}
-    }},
-    "input_value": "value if typing or empty string",
-    "url": "current url or empty string",
-    "description": "brief action description"
-}}"""
-
-            # Send query to Claude
-            await self.client.query(prompt)
-
-            # Collect response
-            response_text = ""
-            async for message in self.client.receive_response():
-                if isinstance(message, AssistantMessage):
-                    for block in message.content:
-                        if isinstance(block, TextBlock):
-                            response_text += block.text
-                elif isinstance(message, ResultMessage):
-                    break
-
-            # Parse JSON response
-            # Extract JSON (handle markdown code blocks)
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0].strip()
-
-            # Find JSON object in response
-            start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}') + 1
-            if start_idx != -1 and end_idx != 0:
-                response_text = response_text[start_idx:end_idx]
-
-            data = json.loads(response_text)
+            data = self._parse_json(response_text)
             data["timestamp"] = timestamp
 
-            return FrameAnalysis(**data)
+            analysis = FrameAnalysis.model_validate(data)
 
         except Exception as e:
-            # Fallback on error (graceful degradation)
-            return FrameAnalysis(
-                timestamp=timestamp,
-                action_type="unknown",
-                description=f"Analysis failed: {str(e)}"
-            )
+            return self._failed_analysis(timestamp, e)
+
+        # Failures are not cached, so a later call retries them
+        self._analysis_cache[cache_key] = analysis
+        if len(self._analysis_cache) > ANALYSIS_CACHE_SIZE:
+            self._analysis_cache.popitem(last=False)
+        return analysis
+
+    async def analyze_frames_batch(
+        self,
+        frames: List[Tuple[int, str]],
+        previous_context: Optional[Sequence[FrameAnalysis]] = None
+    ) -> List[FrameAnalysis]:
+        """
+        Analyze several consecutive frames in a single Claude request.
+
+        Sending frames together pays for the instructions and the round-trip once
+        per batch instead of once per frame.
+
+        Args:
+            frames: List of (timestamp_ms, frame_base64) tuples, in video order
+            previous_context: The last few (``CONTEXT_WINDOW``) frame analyses
+                preceding the batch, for context
+
+        Returns:
+            One FrameAnalysis per input frame, in the same order. If the batch reply
+            cannot be parsed, the frames are retried one request at a time.
+        """
+        if len(frames) == 1:
+            timestamp, frame_base64 = frames[0]
+            return [await self.analyze_frame(frame_base64, timestamp, previous_context)]
+
+        if len(frames) > self.max_batch_size:
+            # Keep each reply within the client's output token cap
+            analyses = []
+            context = deque(previous_context or [], maxlen=CONTEXT_WINDOW)
+            for i in range(0, len(frames), self.max_batch_size):
+                chunk = await self.analyze_frames_batch(frames[i:i + self.max_batch_size], list(context))
+                analyses.extend(chunk)
+                context.extend(chunk)
+            return analyses
+
+        try:
+            prompt = [{
+                "type": "text",
+                "text": f"Analyze these {len(frames)} screenshots, taken in order from one screen recording:"
+            }]
+            for i, (timestamp, frame_base64) in enumerate(frames):
+                prompt.append({"type": "text", "text": f"Screenshot {i+1} (timestamp: {timestamp}ms):"})
+                prompt.append(self._image_block(frame_base64))
+
+            context_text = self._build_context_text(previous_context)
+            prompt.append({"type": "text", "text": f"""{context_text}
+
+Respond with a JSON array of exactly {len(frames)} objects, one per screenshot."""})
+
+            response_text = await self._request(prompt)
+
+            items = self._parse_json(response_text, "[")
+            if not isinstance(items, list) or len(items) != len(frames):
+                raise ValueError(
+                    f"Expected a JSON array of {len(frames)} analyses, "
+                    f"got {len(items) if isinstance(items, list) else type(items).__name__}"
+                )
+
+            analyses = []
+            for (timestamp, _), data in zip(frames, items):
+                try:
+                    data["timestamp"] = timestamp
+                    analyses.append(FrameAnalysis.model_validate(data))
+                except Exception as e:
+                    analyses.append(self._failed_analysis(timestamp, e))
+            return analyses
+
+        except ValueError:
+            # Malformed or wrong-length reply: ask about the frames one at a time
+            analyses = []
+            context = deque(previous_context or [], maxlen=CONTEXT_WINDOW)
+            for timestamp, frame_base64 in frames:
+                analysis = await self.analyze_frame(frame_base64, timestamp, list(context))
+                analyses.append(analysis)
+                context.append(analysis)
+            return analyses
+
+        except Exception as e:
+            # Retries are exhausted (rate limits, connection errors) or the request
+            # cannot succeed; re-asking frame by frame would only add load
+            return [self._failed_analysis(timestamp, e) for timestamp, _ in frames]
 
     async def generate_workflow_summary(self, analyses: List[FrameAnalysis]) -> str:
         """
@@ -149,8 +509,6 @@ Respond ONLY with valid JSON in this exact format (no markdown, no code blocks):
             Human-readable workflow summary
         """
         try:
-            await self._ensure_client()
-
             actions_text = "\n".join([
                 f"{i+1}. [{a.timestamp}ms] {a.description}"
                 for i, a in enumerate(analyses)
@@ -168,28 +526,7 @@ Provide:
 
 Be concise and actionable."""
 
-            await self.client.query(prompt)
-
-            # Collect response
-            response_text = ""
-            async for message in self.client.receive_response():
-                if isinstance(message, AssistantMessage):
-                    for block in message.content:
-                        if isinstance(block, TextBlock):
-                            response_text += block.text
-                elif isinstance(message, ResultMessage):
-                    break
-
-            return response_text
+            return await self._request(prompt, summary=True)
 
         except Exception as e:
-            return f"Summary generation failed: {str(e)}"
-        finally:
-            # Cleanup after final operation
-            await self._cleanup()
-
-            # Cleanup temp directory
-            if self.temp_dir:
-                import shutil
-                shutil.rmtree(self.temp_dir, ignore_errors=True)
-                self.temp_dir = None
+            return f"{SUMMARY_FAILED_PREFIX}: {str(e)}"
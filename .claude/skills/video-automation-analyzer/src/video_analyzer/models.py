@@ -1,10 +1,17 @@
 """Pydantic models for type safety and validation."""
+from functools import cached_property
 from typing import Optional, List, Dict
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+
+# Descriptions and summaries returned in place of a failed analysis start with these
+ANALYSIS_FAILED_PREFIX = "Analysis failed"
+SUMMARY_FAILED_PREFIX = "Summary generation failed"
 
 
 class TargetElement(BaseModel):
     """UI element targeted by an action."""
+    model_config = ConfigDict(frozen=True)
+
     type: str = Field(..., description="Element type: button, input, link, etc.")
     text: Optional[str] = Field(None, description="Visible text or label")
     selector: Optional[str] = Field(None, description="CSS/XPath selector")
@@ -12,7 +19,9 @@ class TargetElement(BaseModel):
 
 
 class FrameAnalysis(BaseModel):
-    """Analysis result for a single video frame."""
+    """Analysis result for a single video frame (immutable once built)."""
+    model_config = ConfigDict(frozen=True)
+
     timestamp: int = Field(..., description="Frame timestamp in milliseconds")
     action_type: str = Field(..., description="Action type: click, type, navigate, scroll, etc.")
     target_element: Optional[TargetElement] = None
@@ -20,6 +29,11 @@ class FrameAnalysis(BaseModel):
     url: Optional[str] = Field(None, description="Current URL or application")
     description: str = Field(..., description="Human-readable action description")
 
+    @cached_property
+    def has_web_url(self) -> bool:
+        """Whether ``url`` is an http(s) URL; computed once, as analyses are immutable."""
+        return (self.url or '').startswith(('http://', 'https://'))
+
 
 class WorkflowSummary(BaseModel):
     """Complete workflow analysis summary."""
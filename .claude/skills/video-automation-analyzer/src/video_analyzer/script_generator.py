@@ -1,15 +1,95 @@
 """Automation script generation from workflow analyses."""
-from typing import List, Tuple, Optional
-from jinja2 import Template, Environment, FileSystemLoader
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Hashable, List, Tuple, Optional
+from jinja2 import Template, Environment, FileSystemBytecodeCache, FileSystemLoader
 from pathlib import Path
-import py_compile
 import subprocess
-import tempfile
 import logging
+import re
+import threading
 from .models import FrameAnalysis
 
+# Optional in-process JavaScript parser
+try:
+    import esprima
+    ESPRIMA_AVAILABLE = True
+except ImportError:
+    ESPRIMA_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Descriptions mentioning any of these are desktop (non-web) operations
+DESKTOP_KEYWORDS = [
+    'windows', 'desktop', 'start menu', 'taskbar',
+    'file explorer', 'chrome.exe', '.exe', 'cmd',
+    'powershell', 'terminal'
+]
+
+# All keywords as one case-insensitive alternation, compiled once
+_DESKTOP_RE = re.compile('|'.join(map(re.escape, DESKTOP_KEYWORDS)), re.IGNORECASE)
+
+# Element actions that count as web actions when no web URL is known
+WEB_ACTION_TYPES = frozenset({'click', 'type', 'select'})
+
+# Output format -> template file
+TEMPLATE_FILES = {
+    "playwright": "playwright.js.jinja2",
+    "selenium": "selenium.py.jinja2",
+    "windows-mcp": "windows_mcp.yml.jinja2",
+    "manual": "manual.md.jinja2",
+}
+
+# Escapes for values embedded in generated string literals, as str.translate tables
+# (one pass per value, no regex): Python double-quoted strings, and JavaScript
+# template literals (where "$" is escaped so "${" cannot start an interpolation)
+_PYTHON_STRING_ESCAPES = str.maketrans({'\\': '\\\\', '"': '\\"', '\n': '\\n', '\r': '\\r'})
+_JS_TEMPLATE_ESCAPES = str.maketrans({'\\': '\\\\', '`': '\\`', '$': '\\$'})
+
+# Generated scripts remembered per generator, least recently used evicted first
+SCRIPT_CACHE_SIZE = 64
+
+
+def _freeze(value: Any) -> Hashable:
+    """Turn nested step dicts/lists into hashable tuples for use as a cache key."""
+    if isinstance(value, dict):
+        return tuple((k, _freeze(v)) for k, v in sorted(value.items()))
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _python_string(value: Any) -> str:
+    """Escape a value for use inside a double-quoted Python string literal."""
+    return str(value).translate(_PYTHON_STRING_ESCAPES)
+
+
+def _js_template(value: Any) -> str:
+    """Escape a value for use inside a JavaScript template literal (backticks)."""
+    return str(value).translate(_JS_TEMPLATE_ESCAPES)
+
+
+@lru_cache(maxsize=None)
+def _load_templates(templates_dir: str) -> Tuple[Environment, dict]:
+    """
+    Build the Jinja environment for a templates directory and compile every template.
+
+    Cached per directory, so every generator sharing a directory shares one
+    environment and its compiled templates.
+    """
+    # Templates are loaded once up front; no need to stat them for changes.
+    # Compiled templates persist in a per-user temp directory, so restarts skip
+    # parsing (entries are keyed by source checksum, so edits invalidate them).
+    env = Environment(
+        loader=FileSystemLoader(templates_dir),
+        bytecode_cache=FileSystemBytecodeCache(pattern="video-analyzer-%s.cache"),
+        auto_reload=False
+    )
+    env.filters["python_string"] = _python_string
+    env.filters["js_template"] = _js_template
+    templates = {fmt: env.get_template(filename) for fmt, filename in TEMPLATE_FILES.items()}
+    return env, templates
+
 
 class ScriptGenerator:
     """Generate automation scripts in multiple formats."""
@@ -26,9 +106,13 @@ class ScriptGenerator:
         if templates_dir is None:
             templates_dir = Path(__file__).parent.parent / "templates"
 
-        self.env = Environment(loader=FileSystemLoader(templates_dir))
+        self.env, self._templates = _load_templates(str(Path(templates_dir).resolve()))
         self.validate_syntax = validate_syntax
         self.web_only = web_only
+        # Identical inputs (repeat or preview requests) skip rendering and validation
+        self._script_cache: "OrderedDict[Hashable, str]" = OrderedDict()
+        # Formats may be rendered on several threads at once (asyncio.to_thread)
+        self._script_cache_lock = threading.Lock()
 
     def generate_playwright(
         self,
@@ -47,8 +131,12 @@ class ScriptGenerator:
                 filter_note = f"// Note: {skipped} desktop operation(s) skipped\n"
                 filter_note += "// See workflow_windows_mcp.yml for full automation including desktop\n\n"
 
-        template = self.env.get_template("playwright.js.jinja2")
+        template = self._templates["playwright"]
         steps = self._prepare_steps(filtered_analyses)
+        key = ("playwright", workflow_name, filter_note, _freeze(steps))
+        cached = self._cached_script(key)
+        if cached is not None:
+            return cached
         script = template.render(steps=steps, workflow_name=workflow_name)
 
         # Prepend filter note if any actions were skipped
@@ -65,7 +153,7 @@ class ScriptGenerator:
             if not is_valid:
                 logger.warning(f"Generated Playwright script has syntax errors: {error_msg}")
 
-        return script
+        return self._cache_script(key, script)
 
     def generate_selenium(
         self,
@@ -84,8 +172,12 @@ class ScriptGenerator:
                 filter_note = f"# Note: {skipped} desktop operation(s) skipped\n"
                 filter_note += "# See workflow_windows_mcp.yml for full automation including desktop\n\n"
 
-        template = self.env.get_template("selenium.py.jinja2")
+        template = self._templates["selenium"]
         steps = self._prepare_steps(filtered_analyses)
+        key = ("selenium", workflow_name, filter_note, _freeze(steps))
+        cached = self._cached_script(key)
+        if cached is not None:
+            return cached
         script = template.render(steps=steps, workflow_name=workflow_name)
 
         # Prepend filter note if any actions were skipped
@@ -102,7 +194,7 @@ class ScriptGenerator:
             if not is_valid:
                 logger.warning(f"Generated Selenium script has syntax errors: {error_msg}")
 
-        return script
+        return self._cache_script(key, script)
 
     def generate_windows_mcp(
         self,
@@ -110,15 +202,39 @@ class ScriptGenerator:
         workflow_name: str = "workflow"
     ) -> str:
         """Generate Windows MCP tool sequence."""
-        template = self.env.get_template("windows_mcp.yml.jinja2")
+        template = self._templates["windows-mcp"]
         steps = self._prepare_steps(analyses)
-        return template.render(steps=steps, workflow_name=workflow_name)
+        key = ("windows-mcp", workflow_name, _freeze(steps))
+        cached = self._cached_script(key)
+        if cached is not None:
+            return cached
+        return self._cache_script(key, template.render(steps=steps, workflow_name=workflow_name))
 
     def generate_manual_steps(self, analyses: List[FrameAnalysis], workflow_name: str = "workflow") -> str:
         """Generate human-readable step-by-step instructions."""
-        template = self.env.get_template("manual.md.jinja2")
+        template = self._templates["manual"]
         steps = self._prepare_steps(analyses)
-        return template.render(steps=steps, workflow_name=workflow_name)
+        key = ("manual", workflow_name, _freeze(steps))
+        cached = self._cached_script(key)
+        if cached is not None:
+            return cached
+        return self._cache_script(key, template.render(steps=steps, workflow_name=workflow_name))
+
+    def _cached_script(self, key: Hashable) -> Optional[str]:
+        """Return a previously generated script (None if absent), marking it recently used."""
+        with self._script_cache_lock:
+            script = self._script_cache.get(key)
+            if script is not None:
+                self._script_cache.move_to_end(key)
+            return script
+
+    def _cache_script(self, key: Hashable, script: str) -> str:
+        """Remember a generated script, evicting the least recently used beyond the limit."""
+        with self._script_cache_lock:
+            self._script_cache[key] = script
+            if len(self._script_cache) > SCRIPT_CACHE_SIZE:
+                self._script_cache.popitem(last=False)
+        return script
 
     def _filter_web_actions(self, analyses: List[FrameAnalysis]) -> List[FrameAnalysis]:
         """
@@ -130,23 +246,16 @@ class ScriptGenerator:
         Returns:
             Filtered list containing only web-based actions
         """
-        web_actions = []
-        for analysis in analyses:
-            url = analysis.url or ''
-
-            # Keep if it's a web URL or if no URL but contains web indicators
-            is_web = (
-                url.startswith(('http://', 'https://')) or
-                (analysis.action_type in ['click', 'type', 'select'] and
-                 analysis.target_element and
-                 analysis.target_element.selector and
-                 not self._is_desktop_action(analysis))
+        # One pass; the desktop keyword scan only runs for element actions without a web URL
+        return [
+            analysis for analysis in analyses
+            if analysis.has_web_url or (
+                analysis.action_type in WEB_ACTION_TYPES and
+                analysis.target_element and
+                analysis.target_element.selector and
+                not self._is_desktop_action(analysis)
             )
-
-            if is_web:
-                web_actions.append(analysis)
-
-        return web_actions
+        ]
 
     def _is_desktop_action(self, analysis: FrameAnalysis) -> bool:
         """
@@ -158,28 +267,28 @@ class ScriptGenerator:
         Returns:
             True if this appears to be a desktop operation
         """
-        desktop_keywords = [
-            'windows', 'desktop', 'start menu', 'taskbar',
-            'file explorer', 'chrome.exe', '.exe', 'cmd',
-            'powershell', 'terminal'
-        ]
-
-        description_lower = analysis.description.lower()
-        return any(keyword in description_lower for keyword in desktop_keywords)
+        return _DESKTOP_RE.search(analysis.description) is not None
 
     def _prepare_steps(self, analyses: List[FrameAnalysis]) -> List[dict]:
         """Prepare analyses for template rendering."""
-        return [
-            {
+        steps = []
+        for a in analyses:
+            # Already-validated models: read the fields directly instead of model_dump()
+            te = a.target_element
+            steps.append({
                 'description': a.description,
                 'action_type': a.action_type,
                 'url': a.url or '',
-                'target_element': a.target_element.model_dump() if a.target_element else {},
+                'target_element': {
+                    'type': te.type,
+                    'text': te.text,
+                    'selector': te.selector,
+                    'location': te.location
+                } if te else {},
                 'input_value': a.input_value or '',
                 'wait_time': 1000
-            }
-            for a in analyses
-        ]
+            })
+        return steps
 
     def _validate_python_syntax(self, script: str) -> Tuple[bool, Optional[str]]:
         """
@@ -192,26 +301,18 @@ class ScriptGenerator:
             Tuple of (is_valid, error_message)
         """
         try:
-            # Write to temporary file and compile
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as f:
-                f.write(script)
-                temp_path = f.name
-
-            try:
-                py_compile.compile(temp_path, doraise=True)
-                return True, None
-            finally:
-                # Clean up temp file
-                Path(temp_path).unlink(missing_ok=True)
+            # Compile in-process; nothing is written to disk
+            compile(script, "<generated>", "exec")
+            return True, None
 
-        except py_compile.PyCompileError as e:
+        except SyntaxError as e:
             return False, str(e)
         except Exception as e:
             return False, f"Unexpected error during validation: {e}"
 
     def _validate_javascript_syntax(self, script: str) -> Tuple[bool, Optional[str]]:
         """
-        Validate JavaScript syntax using Node.js (if available).
+        Validate JavaScript syntax with esprima (if installed) or Node.js (if available).
 
         Args:
             script: JavaScript script content
@@ -220,17 +321,22 @@ class ScriptGenerator:
             Tuple of (is_valid, error_message)
         """
         try:
-            # Write to temporary file
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.js', delete=False, encoding='utf-8') as f:
-                f.write(script)
-                temp_path = f.name
+            if ESPRIMA_AVAILABLE:
+                # Parse in-process (pure Python, no subprocess)
+                try:
+                    esprima.parseScript(script)
+                    return True, None
+                except esprima.Error as e:
+                    return False, str(e)
 
             try:
-                # Try to validate with Node.js
+                # Try to validate with Node.js, piping the script through stdin
                 result = subprocess.run(
-                    ['node', '--check', temp_path],
+                    ['node', '--check', '-'],
+                    input=script,
                     capture_output=True,
                     text=True,
+                    encoding='utf-8',
                     timeout=5
                 )
 
@@ -245,9 +351,6 @@ class ScriptGenerator:
                 return True, "Node.js not available for validation"
             except subprocess.TimeoutExpired:
                 return False, "Validation timeout"
-            finally:
-                # Clean up temp file
-                Path(temp_path).unlink(missing_ok=True)
 
         except Exception as e:
             return False, f"Unexpected error during validation: {e}"
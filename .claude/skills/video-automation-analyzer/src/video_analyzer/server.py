@@ -1,26 +1,62 @@
 """MCP server for video automation analyzer."""
 import asyncio
+import hashlib
+import logging
+import os
 import mcp.types as types
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from pathlib import Path
-from typing import Optional
-import json
-import base64
+from typing import List, Optional, Tuple
 
-from .video_processor import VideoProcessor
-from .claude_analyzer import ClaudeAnalyzer
-from .script_generator import ScriptGenerator
-from .models import WorkflowSummary
+from .models import ANALYSIS_FAILED_PREFIX, SUMMARY_FAILED_PREFIX, FrameAnalysis, WorkflowSummary
+
+logger = logging.getLogger(__name__)
 
 
 # MCP Server instance
 server = Server("video-automation-analyzer")
 
-# Global instances
-video_processor = VideoProcessor(fps_sample=1.0)
-claude_analyzer = ClaudeAnalyzer()
-script_generator = ScriptGenerator()
+# Maximum Claude requests in flight per video analysis
+MAX_CONCURRENT_ANALYSES = 8
+
+# Frames sent to Claude together in one analysis request
+FRAMES_PER_REQUEST = 6
+
+# Finished video analyses (without scripts) are stored here, keyed by the video's
+# content and the analysis settings, so re-running an unchanged video skips frame
+# decoding and all Claude requests
+RESULT_CACHE_DIR = Path.home() / ".cache" / "video-analyzer" / "results"
+
+# Global instances, created on first use so that starting the server (and listing
+# tools) does not load OpenCV, the Agent SDK or the templates
+_video_processor = None
+_claude_analyzer = None
+_script_generator = None
+
+
+def _get_video_processor():
+    global _video_processor
+    if _video_processor is None:
+        from .video_processor import VideoProcessor
+        _video_processor = VideoProcessor(fps_sample=1.0)
+    return _video_processor
+
+
+def _get_claude_analyzer():
+    global _claude_analyzer
+    if _claude_analyzer is None:
+        from .claude_analyzer import ClaudeAnalyzer
+        _claude_analyzer = ClaudeAnalyzer(max_concurrency=MAX_CONCURRENT_ANALYSES)
+    return _claude_analyzer
+
+
+def _get_script_generator():
+    global _script_generator
+    if _script_generator is None:
+        from .script_generator import ScriptGenerator
+        _script_generator = ScriptGenerator()
+    return _script_generator
 
 
 @server.list_tools()
@@ -55,6 +91,11 @@ async def list_tools() -> list[types.Tool]:
                         "type": "number",
                         "default": 1.0,
                         "description": "Frames per second to sample"
+                    },
+                    "use_cache": {
+                        "type": "boolean",
+                        "default": True,
+                        "description": "Reuse the analysis of an earlier run on the same video and settings"
                     }
                 },
                 "required": ["video_path"]
@@ -94,26 +135,29 @@ async def _handle_video_analysis(arguments: dict) -> list[types.TextContent]:
     output_formats = arguments.get("output_formats", ["playwright", "manual"])
     fps_sample = arguments.get("fps_sample", 1.0)
 
+    video_processor = _get_video_processor()
+    claude_analyzer = _get_claude_analyzer()
+    script_generator = _get_script_generator()
+
     # Update processor FPS
-    global video_processor
     video_processor.fps_sample = fps_sample
 
-    # Extract frames
-    frames = video_processor.extract_key_frames(video_path)
-
-    # Analyze frames with Claude Vision
-    analyses = []
-    for timestamp, frame in frames:
-        frame_base64 = video_processor.frame_to_base64(frame)
-        analysis = await claude_analyzer.analyze_frame(
-            frame_base64,
-            timestamp,
-            previous_context=analyses
-        )
-        analyses.append(analysis)
+    # Reuse the result of an earlier run on the same video and settings
+    cache_path = None
+    cached = None
+    if arguments.get("use_cache", True):
+        cache_path = await asyncio.to_thread(_result_cache_path, video_path, video_processor, claude_analyzer)
+        cached = await asyncio.to_thread(_load_cached_result, cache_path)
+
+    if cached is not None:
+        analyses = cached.analyses
+        duration_ms = cached.total_duration_ms
+        workflow_summary_text = cached.summary
+    else:
+        analyses, duration_ms = await _analyze_video_frames(video_path, video_processor, claude_analyzer)
 
-    # Generate workflow summary
-    workflow_summary_text = await claude_analyzer.generate_workflow_summary(analyses)
+        # Generate workflow summary
+        workflow_summary_text = await claude_analyzer.generate_workflow_summary(analyses)
 
     # Generate scripts
     scripts = {}
@@ -134,15 +178,18 @@ async def _handle_video_analysis(arguments: dict) -> list[types.TextContent]:
     # Create summary
     summary = WorkflowSummary(
         video_path=video_path,
-        total_frames=len(frames),
-        total_duration_ms=frames[-1][0] if frames else 0,
+        total_frames=len(analyses),
+        total_duration_ms=duration_ms,
         analyses=analyses,
         summary=workflow_summary_text,
         scripts=scripts
     )
 
+    if cached is None and cache_path is not None:
+        await asyncio.to_thread(_store_result, cache_path, summary)
+
     # Format response
-    response_text = f"""# Video Workflow Analysis Complete
+    parts = [f"""# Video Workflow Analysis Complete
 
 **Video**: {video_path}
 **Frames Analyzed**: {summary.total_frames}
@@ -154,60 +201,203 @@ async def _handle_video_analysis(arguments: dict) -> list[types.TextContent]:
 
 ## Generated Scripts
 
-"""
+"""]
 
     for format_name, script_content in scripts.items():
-        response_text += f"\n### {format_name.upper()}\n\n```\n{script_content}\n```\n"
+        parts.append(f"\n### {format_name.upper()}\n\n```\n{script_content}\n```\n")
+
+    return [types.TextContent(type="text", text="".join(parts))]
+
 
-    return [types.TextContent(type="text", text=response_text)]
+async def _analyze_video_frames(video_path, video_processor, claude_analyzer) -> Tuple[List[FrameAnalysis], int]:
+    """Decode and analyze a video's key frames; returns (analyses, last frame timestamp)."""
+    from .claude_analyzer import CONTEXT_WINDOW
+
+    # Analyze frames with Claude Vision as they are decoded, FRAMES_PER_REQUEST
+    # frames per request. Frames are encoded as soon as they are decoded, so raw
+    # frames are not held in memory, and batches are queued for
+    # MAX_CONCURRENT_ANALYSES workers; the bounded queue stops decoding from
+    # running ahead of analysis. The first batch is analyzed before the rest fan
+    # out, so every later batch starts with context from the frames before it.
+    queue: "asyncio.Queue[Optional[Tuple[int, List[Tuple[int, str]]]]]" = asyncio.Queue(
+        maxsize=MAX_CONCURRENT_ANALYSES
+    )
+    analyses: List[Optional[FrameAnalysis]] = []
+    last_timestamp = 0
+    first_batch_done = asyncio.Event()
+
+    def next_encoded(frames):
+        item = next(frames, None)
+        if item is None:
+            return None
+        timestamp, frame = item
+        return timestamp, video_processor.frame_to_base64(frame)
+
+    async def submit(batch: List[Tuple[int, str]]) -> None:
+        start = len(analyses)
+        analyses.extend([None] * len(batch))
+        await queue.put((start, batch))
+
+    async def producer() -> None:
+        nonlocal last_timestamp
+        batch = []
+        frames = video_processor.iter_key_frames(video_path)
+        try:
+            # Decode and JPEG-encode on a worker thread so in-flight analyses keep running
+            while (item := await asyncio.to_thread(next_encoded, frames)) is not None:
+                last_timestamp = item[0]
+                batch.append(item)
+                if len(batch) == FRAMES_PER_REQUEST:
+                    await submit(batch)
+                    batch = []
+            if batch:
+                await submit(batch)
+        finally:
+            # Always release the workers, even if decoding failed
+            for _ in range(MAX_CONCURRENT_ANALYSES):
+                await queue.put(None)
+
+    async def worker() -> None:
+        while (item := await queue.get()) is not None:
+            start, batch = item
+            if start > 0:
+                await first_batch_done.wait()
+
+            # Batches run concurrently, so context is the latest earlier frames
+            # that have already finished (the tail of the previous batch when it is done)
+            context: List[FrameAnalysis] = []
+            for index in range(start - 1, -1, -1):
+                if len(context) == CONTEXT_WINDOW:
+                    break
+                earlier = analyses[index]
+                if earlier is not None:
+                    context.append(earlier)
+            context.reverse()
+
+            try:
+                results = await claude_analyzer.analyze_frames_batch(batch, context)
+                analyses[start:start + len(results)] = results
+            finally:
+                if start == 0:
+                    first_batch_done.set()
+
+    tasks = [asyncio.create_task(producer())]
+    tasks.extend(asyncio.create_task(worker()) for _ in range(MAX_CONCURRENT_ANALYSES))
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    return [analysis for analysis in analyses if analysis is not None], last_timestamp
+
+
+def _result_cache_path(video_path: str, video_processor, claude_analyzer) -> Optional[Path]:
+    """Cache file for this video's content and analysis settings (None if unreadable)."""
+    try:
+        with open(video_path, "rb") as f:
+            video_digest = hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+    except OSError:
+        # Let frame extraction report the problem
+        return None
+
+    settings = (
+        video_processor.fps_sample,
+        video_processor.min_change_threshold,
+        video_processor.change_metric,
+        video_processor.noise_level,
+        video_processor.keyframes_only,
+        video_processor.backend,
+        video_processor.max_image_dim,
+        video_processor.jpeg_quality,
+        claude_analyzer.frame_model,
+        claude_analyzer.summary_model,
+    )
+    key = hashlib.blake2b(f"{video_digest}:{settings!r}".encode(), digest_size=16).hexdigest()
+    return RESULT_CACHE_DIR / f"{key}.json"
+
+
+def _load_cached_result(cache_path: Optional[Path]) -> Optional[WorkflowSummary]:
+    """Read a stored analysis, or None if there is none (or it is unreadable)."""
+    if cache_path is None:
+        return None
+    try:
+        return WorkflowSummary.model_validate_json(cache_path.read_bytes())
+    except (OSError, ValueError):
+        return None
+
+
+def _store_result(cache_path: Path, summary: WorkflowSummary) -> None:
+    """Store an analysis for later runs, unless the summary or some frames failed."""
+    if summary.summary.startswith(SUMMARY_FAILED_PREFIX):
+        return
+    if any(a.action_type == "unknown" and a.description.startswith(ANALYSIS_FAILED_PREFIX) for a in summary.analyses):
+        return
+
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so concurrent readers never see a partial file
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(summary.model_dump_json(exclude={"scripts"}), encoding="utf-8")
+        tmp_path.replace(cache_path)
+    except OSError as e:
+        logger.warning(f"Could not cache analysis result: {e}")
 
 
 async def _handle_screenshot_analysis(arguments: dict) -> list[types.TextContent]:
     """Handle single screenshot analysis."""
     image_path = arguments["image_path"]
 
-    # Read and encode image
-    import cv2
-    frame = cv2.imread(image_path)
-    if frame is None:
-        raise FileNotFoundError(f"Could not read image: {image_path}")
+    # Read and encode image on a worker thread, off the event loop
+    def read_and_encode():
+        import cv2
+        frame = cv2.imread(image_path)
+        if frame is None:
+            raise FileNotFoundError(f"Could not read image: {image_path}")
+        return _get_video_processor().frame_to_base64(frame)
 
-    frame_base64 = video_processor.frame_to_base64(frame)
+    frame_base64 = await asyncio.to_thread(read_and_encode)
 
     # Analyze
-    analysis = await claude_analyzer.analyze_frame(frame_base64, 0)
+    analysis = await _get_claude_analyzer().analyze_frame(frame_base64, 0)
 
-    response_text = f"""# Screenshot Analysis
+    parts = [f"""# Screenshot Analysis
 
 **Action**: {analysis.action_type}
 **Description**: {analysis.description}
 
-"""
+"""]
 
     if analysis.target_element:
-        response_text += f"**Target Element**: {analysis.target_element.type}\n"
+        parts.append(f"**Target Element**: {analysis.target_element.type}\n")
         if analysis.target_element.text:
-            response_text += f"**Text**: {analysis.target_element.text}\n"
+            parts.append(f"**Text**: {analysis.target_element.text}\n")
         if analysis.target_element.selector:
-            response_text += f"**Selector**: {analysis.target_element.selector}\n"
+            parts.append(f"**Selector**: {analysis.target_element.selector}\n")
 
     if analysis.input_value:
-        response_text += f"\n**Input Value**: {analysis.input_value}\n"
+        parts.append(f"\n**Input Value**: {analysis.input_value}\n")
 
     if analysis.url:
-        response_text += f"\n**URL**: {analysis.url}\n"
+        parts.append(f"\n**URL**: {analysis.url}\n")
 
-    return [types.TextContent(type="text", text=response_text)]
+    return [types.TextContent(type="text", text="".join(parts))]
 
 
 async def main():
     """Run MCP server using stdio transport."""
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            server.create_initialization_options()
-        )
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(
+                read_stream,
+                write_stream,
+                server.create_initialization_options()
+            )
+    finally:
+        # Claude clients stay connected between tool calls; close them on shutdown
+        if _claude_analyzer is not None:
+            await _claude_analyzer.close()
 
 
 if __name__ == "__main__":
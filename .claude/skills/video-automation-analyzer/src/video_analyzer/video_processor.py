@@ -2,25 +2,98 @@
 import cv2
 import numpy as np
 from pathlib import Path
-from typing import List, Tuple
+from typing import Any, Callable, Iterator, List, Optional, Tuple, cast
 import base64
-from PIL import Image
+from collections import deque
+from functools import lru_cache, partial
 import io
+import queue
+import re
+import shutil
+import subprocess
+import threading
+
+# Thumbnail (width, height) frames are compared at
+DIFF_SIZE = (160, 90)
+
+# Frame interval (in frames) from which OpenCV seeks to the next sample instead of
+# grabbing every frame in between; seeking restarts decoding at a keyframe, so
+# it only pays off when samples are far apart
+SEEK_MIN_INTERVAL = 60
+
+# Presentation time of a frame in ffmpeg's showinfo filter log
+_SHOWINFO_TIME = re.compile(r"\bn:\s*\d+\s+pts:\s*\S+\s+pts_time:(\S+)")
+
+
+@lru_cache(maxsize=None)
+def _passthrough_args() -> Tuple[str, ...]:
+    """ffmpeg output options that pass every decoded frame through unchanged."""
+    # -fps_mode replaced the deprecated -vsync in ffmpeg 5.1; probe once for it
+    try:
+        help_text = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-h", "full"],
+            capture_output=True, text=True, errors="replace"
+        ).stdout
+    except OSError:
+        help_text = ""
+    if "-fps_mode" in help_text:
+        return ("-fps_mode", "passthrough")
+    return ("-vsync", "0")
 
 
 class VideoProcessor:
     """Extract key frames from video recordings."""
 
-    def __init__(self, fps_sample: float = 1.0, min_change_threshold: float = 0.15):
+    def __init__(
+        self,
+        fps_sample: float = 1.0,
+        min_change_threshold: float = 0.15,
+        max_image_dim: Optional[int] = None,
+        jpeg_quality: int = 85,
+        backend: str = "auto",
+        keyframes_only: bool = False,
+        change_metric: str = "pixel",
+        noise_level: int = 0
+    ):
         """
         Initialize video processor.
 
         Args:
             fps_sample: Frames per second to sample (default: 1.0)
             min_change_threshold: Minimum frame difference to consider significant (0.0-1.0)
+            max_image_dim: Downscale encoded frames so their longer side is at most
+                this many pixels (default: None, keep original size)
+            jpeg_quality: JPEG quality used when encoding frames, 1-100 (default: 85)
+            backend: Frame decoder: "ffmpeg" (ffmpeg's fps filter drops unsampled frames
+                before they reach Python), "opencv", or "auto" to use ffmpeg when it is
+                on PATH (default: "auto")
+            keyframes_only: Decode only the video's keyframes (I-frames), keeping at most
+                ``fps_sample`` of them per second. Much cheaper than full decoding, but
+                timestamps snap to the nearest keyframe. Requires ffmpeg (default: False)
+            change_metric: How frames are compared: "pixel" (share of changed pixels
+                in a thumbnail) or "dhash" (share of differing bits between 64-bit
+                perceptual hashes, which ignores cursor blinks and antialiasing noise
+                but can miss small edits) (default: "pixel")
+            noise_level: With the "pixel" metric, per-pixel grayscale changes (0-255)
+                up to this level are not counted, e.g. 8 to ignore compression
+                artifacts (default: 0, every changed pixel counts)
         """
+        if backend not in ("auto", "ffmpeg", "opencv"):
+            raise ValueError(f"Unknown frame decoding backend: {backend}")
+        if keyframes_only and backend == "opencv":
+            raise ValueError("Keyframe-only decoding requires the ffmpeg backend")
+        if change_metric not in ("pixel", "dhash"):
+            raise ValueError(f"Unknown frame change metric: {change_metric}")
+
         self.fps_sample = fps_sample
         self.min_change_threshold = min_change_threshold
+        self.max_image_dim = max_image_dim
+        self.jpeg_quality = jpeg_quality
+        self.backend = backend
+        self.keyframes_only = keyframes_only
+        self.change_metric = change_metric
+        self.noise_level = noise_level
+        self._diff_size = DIFF_SIZE
 
     def extract_key_frames(self, video_path: str) -> List[Tuple[int, np.ndarray]]:
         """
@@ -37,11 +110,61 @@ class VideoProcessor:
             RuntimeError: If video cannot be opened (codec issues)
             ValueError: If video is empty or corrupted
         """
+        return list(self.iter_key_frames(video_path))
+
+    def iter_key_frames(self, video_path: str) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Yield key frames as they are decoded.
+
+        Same sampling as ``extract_key_frames``, but frames are produced one at a
+        time so callers can start working on early frames while later ones are
+        still being decoded.
+
+        Args:
+            video_path: Path to video file
+
+        Yields:
+            (timestamp_ms, frame_array) tuples
+
+        Raises:
+            FileNotFoundError: If video file doesn't exist
+            RuntimeError: If video cannot be opened (codec issues)
+            ValueError: If video is empty or corrupted
+        """
+        # Each kept frame is reduced to a signature that later frames are compared
+        # to; the pixel metric reuses one scratch buffer for every comparison
+        signature: Callable[[np.ndarray], Any]
+        difference: Callable[[Any, Any], float]
+        if self.change_metric == "dhash":
+            signature, difference = self.frame_hash, self._hash_difference
+        else:
+            scratch = np.empty(self._diff_size[::-1], dtype=np.uint8)
+            signature = self._diff_thumbnail
+            difference = partial(self._thumbnail_difference, noise_level=self.noise_level, out=scratch)
+
+        prev: Any = None
+
+        for timestamp, frame in self._iter_sampled_frames(video_path):
+            current: Any = signature(frame)
+
+            # Check frame difference
+            # Decoders hand out a new array per frame, so kept frames need no copy;
+            # only the kept frame's signature is held for later comparisons
+            if prev is None or difference(prev, current) > self.min_change_threshold:
+                yield timestamp, frame
+                prev = current
+
+    def _iter_sampled_frames(self, video_path: str) -> Iterator[Tuple[int, np.ndarray]]:
+        """Yield (timestamp_ms, frame) at ``fps_sample`` using the configured backend."""
         # Validate file exists
         if not Path(video_path).exists():
             raise FileNotFoundError(f"Video not found: {video_path}")
 
-        cap = cv2.VideoCapture(video_path)
+        use_ffmpeg = self.backend == "ffmpeg" or (
+            self.backend == "auto" and shutil.which("ffmpeg") is not None
+        )
+
+        cap = self._open_capture(video_path, hw_accel=not use_ffmpeg)
         if not cap.isOpened():
             raise RuntimeError(
                 f"Failed to open video file: {video_path}. "
@@ -55,70 +178,242 @@ class VideoProcessor:
             raise ValueError(f"Video file appears to be empty or corrupted: {video_path}")
 
         fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_interval = max(1, int(fps / self.fps_sample))
 
-        frames = []
-        prev_frame = None
+        if use_ffmpeg:
+            # OpenCV was only needed for the stream properties
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            cap.release()
+            yield from self._iter_frames_ffmpeg(video_path, fps, width, height)
+        elif self.keyframes_only:
+            cap.release()
+            raise RuntimeError("Keyframe-only decoding requires ffmpeg, which was not found on PATH")
+        else:
+            yield from self._iter_frames_opencv(cap, fps)
+
+    @staticmethod
+    def _open_capture(video_path: str, hw_accel: bool) -> cv2.VideoCapture:
+        """
+        Open a video with OpenCV.
+
+        When the frames will be decoded by OpenCV, hardware decoding (VAAPI,
+        D3D11, ...) is requested from its ffmpeg backend; it falls back to software
+        decoding when unavailable, and to OpenCV's default backend if ffmpeg
+        cannot open the file.
+        """
+        if hw_accel:
+            cap = cv2.VideoCapture(
+                video_path, cv2.CAP_FFMPEG,
+                [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+            )
+            if cap.isOpened():
+                return cap
+            cap.release()
+        return cv2.VideoCapture(video_path)
+
+    def _iter_frames_opencv(self, cap: cv2.VideoCapture, fps: float) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Read every Nth frame with OpenCV.
+
+        Skipped frames are only grabbed (no colour conversion into a BGR image).
+        When samples are far apart the capture seeks straight to the next one,
+        falling back to grabbing if the container does not support seeking.
+        """
+        frame_interval = max(1, int(fps / self.fps_sample))
+        use_seek = frame_interval >= SEEK_MIN_INTERVAL
         frame_count = 0
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
+        try:
+            while cap.grab():
+                # Sample every N frames
+                if frame_count % frame_interval == 0:
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        break
+                    yield int(frame_count / fps * 1000), frame
+
+                    if use_seek:
+                        target = frame_count + frame_interval
+                        if cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+                            frame_count = target
+                            continue
+                        use_seek = False
+
+                frame_count += 1
+        finally:
+            # Release even if the caller stops consuming early
+            cap.release()
+
+    def _iter_frames_ffmpeg(
+        self,
+        video_path: str,
+        fps: float,
+        width: int,
+        height: int
+    ) -> Iterator[Tuple[int, np.ndarray]]:
+        """Have ffmpeg decode and sample the stream and read raw BGR frames from a pipe."""
+        if self.keyframes_only:
+            # The decoder drops non-key frames; showinfo logs each kept frame's time
+            input_args = ["-skip_frame", "nokey"]
+            output_args = [*_passthrough_args(), "-vf", "showinfo"]
+            log_level = "info"
+        else:
+            # Never ask the fps filter for more frames than the video has
+            sample_fps = min(self.fps_sample, fps) if fps > 0 else self.fps_sample
+            input_args = []
+            output_args = ["-vf", f"fps={sample_fps}"]
+            log_level = "error"
+
+        command = [
+            "ffmpeg", "-hide_banner", "-nostats", "-nostdin", "-loglevel", log_level,
+            *input_args, "-i", video_path,
+            *output_args, "-f", "rawvideo", "-pix_fmt", "bgr24", "-"
+        ]
+        frame_size = width * height * 3
+
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # Both are buffered pipes (the default bufsize), so stdout supports readinto
+        stdout = cast(io.BufferedReader, process.stdout)
+        stderr = cast(io.BufferedReader, process.stderr)
+
+        # Drain stderr on a thread so a chatty decoder cannot fill the pipe and stall
+        frame_times: "queue.Queue[Optional[float]]" = queue.Queue()
+        log_tail: "deque[str]" = deque(maxlen=20)
+
+        def read_log():
+            for raw_line in stderr:
+                line = raw_line.decode("utf-8", errors="replace").rstrip()
+                match = _SHOWINFO_TIME.search(line)
+                if match:
+                    frame_times.put(float(match.group(1)))
+                else:
+                    log_tail.append(line)
+            frame_times.put(None)
+
+        log_reader = threading.Thread(target=read_log, daemon=True)
+        log_reader.start()
 
-            # Sample every N frames
-            if frame_count % frame_interval == 0:
-                timestamp = int(frame_count / fps * 1000)
+        try:
+            index = 0
+            next_due_ms = 0.0
+            while True:
+                # Each frame gets its own writable buffer, so callers may keep it
+                data = bytearray(frame_size)
+                if stdout.readinto(data) < frame_size:
+                    break
 
-                # Check frame difference
-                if prev_frame is not None:
-                    diff = self._calculate_frame_difference(prev_frame, frame)
+                frame = np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
 
-                    if diff > self.min_change_threshold:
-                        frames.append((timestamp, frame.copy()))
-                        prev_frame = frame
+                if self.keyframes_only:
+                    pts_time = frame_times.get()
+                    if pts_time is None:
+                        raise RuntimeError(f"ffmpeg did not report keyframe times for {video_path}")
+
+                    # Keep at most fps_sample keyframes per second
+                    timestamp = int(pts_time * 1000)
+                    if timestamp < next_due_ms:
+                        continue
+                    next_due_ms = timestamp + 1000 / self.fps_sample
                 else:
-                    frames.append((timestamp, frame.copy()))
-                    prev_frame = frame
+                    timestamp = int(index / sample_fps * 1000)
 
-            frame_count += 1
+                yield timestamp, frame
+                index += 1
 
-        cap.release()
-        return frames
+            if process.wait() != 0 and index == 0:
+                log_reader.join()
+                message = "\n".join(log_tail).strip()
+                raise RuntimeError(f"ffmpeg failed to decode {video_path}: {message}")
+        finally:
+            # Stop ffmpeg even if the caller stops consuming early
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            stdout.close()
+            log_reader.join()
+            stderr.close()
 
     def _calculate_frame_difference(self, frame1: np.ndarray, frame2: np.ndarray) -> float:
         """
         Calculate normalized difference between frames.
 
+        Frames are compared as small grayscale thumbnails, which touches a tiny
+        fraction of the pixels; changes up to ``noise_level`` are ignored.
+
         Returns:
             Difference score (0.0 = identical, 1.0 = completely different)
         """
-        gray1 = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
-        gray2 = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY)
+        return self._thumbnail_difference(
+            self._diff_thumbnail(frame1), self._diff_thumbnail(frame2), self.noise_level
+        )
 
-        diff = cv2.absdiff(gray1, gray2)
-        non_zero = np.count_nonzero(diff)
+    def _diff_thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        """Shrink a frame to the grayscale thumbnail frames are compared at."""
+        small = cv2.resize(frame, self._diff_size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
 
-        return non_zero / diff.size
+    @staticmethod
+    def _thumbnail_difference(
+        thumb1: np.ndarray,
+        thumb2: np.ndarray,
+        noise_level: int = 0,
+        out: Optional[np.ndarray] = None
+    ) -> float:
+        """Share of thumbnail pixels that changed by more than ``noise_level`` (0.0-1.0)."""
+        out = cv2.absdiff(thumb1, thumb2, dst=out)
+        cv2.threshold(out, noise_level, 255, cv2.THRESH_BINARY, dst=out)
+        return cv2.countNonZero(out) / out.size
+
+    @staticmethod
+    def _hash_difference(hash1: int, hash2: int) -> float:
+        """Share of differing bits between two 64-bit frame hashes (0.0-1.0)."""
+        return (hash1 ^ hash2).bit_count() / 64
 
     def frame_to_base64(self, frame: np.ndarray) -> str:
         """
         Convert frame to base64-encoded JPEG for Claude Vision API.
 
+        Claude downscales large images anyway, so frames larger than
+        ``max_image_dim`` are shrunk first to cut upload size and image tokens.
+
         Args:
             frame: OpenCV frame (BGR format)
 
         Returns:
             Base64-encoded JPEG string
         """
-        # BGR to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        height, width = frame.shape[:2]
+        if self.max_image_dim and max(height, width) > self.max_image_dim:
+            scale = self.max_image_dim / max(height, width)
+            frame = cv2.resize(
+                frame,
+                (max(1, round(width * scale)), max(1, round(height * scale))),
+                interpolation=cv2.INTER_AREA
+            )
 
-        # Convert to PIL Image
-        pil_image = Image.fromarray(rgb_frame)
+        # Compress as JPEG straight from the BGR buffer
+        ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError("Failed to encode frame as JPEG")
 
-        # Compress as JPEG
-        buffered = io.BytesIO()
-        pil_image.save(buffered, format="JPEG", quality=85)
+        return base64.b64encode(buffer.data).decode('ascii')
 
-        return base64.b64encode(buffered.getvalue()).decode('utf-8')
+    @staticmethod
+    def frame_hash(frame: np.ndarray, hash_size: int = 8) -> int:
+        """
+        Compute a difference hash (dHash) of a frame.
+
+        Visually similar frames have hashes a small Hamming distance apart,
+        e.g. ``(a ^ b).bit_count()``.
+
+        Args:
+            frame: OpenCV frame (BGR format)
+            hash_size: Hash is ``hash_size * hash_size`` bits (default: 8)
+
+        Returns:
+            Hash as an integer
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+        return int.from_bytes(np.packbits(bits).tobytes(), "big")
@@ -1,17 +1,30 @@
 """Pytest configuration and fixtures."""
+import os
 import pytest
 from pathlib import Path
 import numpy as np
 import cv2
 
 
-@pytest.fixture
+def pytest_collection_modifyitems(config, items):
+    """Skip integration tests up front when no API key is available."""
+    if os.environ.get("ANTHROPIC_API_KEY"):
+        return
+
+    # Claude Code provides the key automatically
+    skip_integration = pytest.mark.skip(reason="ANTHROPIC_API_KEY not set (automatically provided in Claude Code)")
+    for item in items:
+        if "integration" in item.keywords:
+            item.add_marker(skip_integration)
+
+
+@pytest.fixture(scope="session")
 def fixtures_dir():
     """Path to test fixtures directory."""
     return Path(__file__).parent / "fixtures"
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_video_path(fixtures_dir):
     """Path to sample login workflow video."""
     path = fixtures_dir / "sample_login.mp4"
@@ -20,7 +33,7 @@ def sample_video_path(fixtures_dir):
     return str(path)
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_screenshot_path(fixtures_dir):
     """Path to sample screenshot."""
     path = fixtures_dir / "screenshot_click.png"
@@ -29,15 +42,63 @@ def sample_screenshot_path(fixtures_dir):
     return str(path)
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
+def sample_screenshot_frame(sample_screenshot_path):
+    """Sample screenshot decoded once per session (BGR)."""
+    return cv2.imread(sample_screenshot_path, cv2.IMREAD_COLOR)
+
+
+@pytest.fixture(scope="session")
+def sample_screenshot_base64(sample_screenshot_frame):
+    """Sample screenshot encoded once per session as base64 JPEG."""
+    from video_analyzer import VideoProcessor
+
+    return VideoProcessor().frame_to_base64(sample_screenshot_frame)
+
+
+@pytest.fixture(scope="session")
+def script_generator():
+    """ScriptGenerator with default options, shared by the whole session."""
+    from video_analyzer import ScriptGenerator
+
+    return ScriptGenerator()
+
+
+@pytest.fixture(scope="session")
+def script_generator_no_validate():
+    """Shared ScriptGenerator that skips syntax validation (tests check it themselves)."""
+    from video_analyzer import ScriptGenerator
+
+    return ScriptGenerator(validate_syntax=False)
+
+
+@pytest.fixture(scope="session")
+def script_generator_all_actions():
+    """Shared ScriptGenerator that keeps desktop actions in web scripts."""
+    from video_analyzer import ScriptGenerator
+
+    return ScriptGenerator(web_only=False)
+
+
+@pytest.fixture(scope="session")
 def dummy_frame():
-    """Create dummy video frame for testing."""
-    return np.zeros((480, 640, 3), dtype=np.uint8)
+    """Dummy video frame for testing (read-only, shared by the session)."""
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    frame.flags.writeable = False
+    return frame
+
+
+@pytest.fixture(scope="session")
+def dummy_frame_base64(dummy_frame):
+    """Dummy video frame encoded once for the analyzer tests."""
+    from video_analyzer import VideoProcessor
+
+    return VideoProcessor().frame_to_base64(dummy_frame)
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_analyses():
-    """Sample frame analyses for testing script generation."""
+    """Sample frame analyses for testing script generation (frozen models, shared by the session)."""
     from video_analyzer.models import FrameAnalysis, TargetElement
 
     return [
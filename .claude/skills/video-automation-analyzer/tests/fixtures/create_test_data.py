@@ -14,112 +14,168 @@ def create_test_video():
     duration_seconds = 5
     total_frames = fps * duration_seconds
 
-    # Create video writer
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    writer = cv2.VideoWriter(str(output_path), fourcc, fps, (width, height))
+    # Everything that is the same in every frame is drawn once
+    base_frame = np.full((height, width, 3), 255, dtype=np.uint8)
 
-    if not writer.isOpened():
-        print(f"Error: Could not create video writer")
-        return False
+    # Header bar
+    cv2.rectangle(base_frame, (0, 0), (width, 80), (70, 130, 180), -1)
+    cv2.putText(base_frame, "Example Login Page", (50, 50),
+               cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
 
-    print(f"Creating test video: {output_path}")
+    # Login form box
+    form_x, form_y = 400, 200
+    form_width, form_height = 480, 400
+    cv2.rectangle(base_frame, (form_x, form_y),
+                 (form_x + form_width, form_y + form_height),
+                 (200, 200, 200), 2)
 
-    # Create frames with progressive changes
-    for frame_num in range(total_frames):
-        # Create blank frame (white background)
-        frame = np.ones((height, width, 3), dtype=np.uint8) * 255
-
-        # Add some UI elements that change over time
-        # Simulate a login page with different states
-
-        # Header bar
-        cv2.rectangle(frame, (0, 0), (width, 80), (70, 130, 180), -1)
-        cv2.putText(frame, "Example Login Page", (50, 50),
-                   cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
-
-        # Login form box
-        form_x, form_y = 400, 200
-        form_width, form_height = 480, 400
-        cv2.rectangle(frame, (form_x, form_y),
-                     (form_x + form_width, form_y + form_height),
-                     (200, 200, 200), 2)
-
-        # Title
-        cv2.putText(frame, "Sign In", (form_x + 180, form_y + 60),
-                   cv2.FONT_HERSHEY_SIMPLEX, 1.2, (50, 50, 50), 2)
-
-        # Different states based on time
-        if frame_num < fps * 1:  # First second: empty form
-            # Email field
-            cv2.rectangle(frame, (form_x + 40, form_y + 120),
-                         (form_x + 440, form_y + 160), (220, 220, 220), -1)
-            cv2.putText(frame, "Email", (form_x + 50, form_y + 145),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (150, 150, 150), 1)
-
-            # Password field
-            cv2.rectangle(frame, (form_x + 40, form_y + 200),
-                         (form_x + 440, form_y + 240), (220, 220, 220), -1)
-            cv2.putText(frame, "Password", (form_x + 50, form_y + 225),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (150, 150, 150), 1)
-
-        elif frame_num < fps * 2.5:  # Second 1-2.5: typing email
-            # Email field with text
-            cv2.rectangle(frame, (form_x + 40, form_y + 120),
-                         (form_x + 440, form_y + 160), (255, 255, 220), -1)
-            email_text = "user@example.com"[:int((frame_num - fps) / 3)]
-            cv2.putText(frame, email_text, (form_x + 50, form_y + 145),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1)
-
-            # Password field (empty)
-            cv2.rectangle(frame, (form_x + 40, form_y + 200),
-                         (form_x + 440, form_y + 240), (220, 220, 220), -1)
-            cv2.putText(frame, "Password", (form_x + 50, form_y + 225),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (150, 150, 150), 1)
-
-        elif frame_num < fps * 4:  # Second 2.5-4: typing password
-            # Email field (filled)
-            cv2.rectangle(frame, (form_x + 40, form_y + 120),
-                         (form_x + 440, form_y + 160), (255, 255, 255), -1)
-            cv2.putText(frame, "user@example.com", (form_x + 50, form_y + 145),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1)
-
-            # Password field with dots
-            cv2.rectangle(frame, (form_x + 40, form_y + 200),
-                         (form_x + 440, form_y + 240), (255, 255, 220), -1)
-            dots = "•" * min(8, int((frame_num - fps * 2.5) / 4))
-            cv2.putText(frame, dots, (form_x + 50, form_y + 225),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 1)
-
-        else:  # Second 4-5: clicking login button
-            # Email field (filled)
-            cv2.rectangle(frame, (form_x + 40, form_y + 120),
-                         (form_x + 440, form_y + 160), (255, 255, 255), -1)
-            cv2.putText(frame, "user@example.com", (form_x + 50, form_y + 145),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1)
-
-            # Password field (filled)
-            cv2.rectangle(frame, (form_x + 40, form_y + 200),
-                         (form_x + 440, form_y + 240), (255, 255, 255), -1)
-            cv2.putText(frame, "••••••••", (form_x + 50, form_y + 225),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 1)
-
-            # Login button (highlighted when clicking)
-            button_color = (100, 150, 250) if frame_num > fps * 4.5 else (70, 130, 180)
-            cv2.rectangle(frame, (form_x + 140, form_y + 300),
-                         (form_x + 340, form_y + 350), button_color, -1)
-            cv2.putText(frame, "Login", (form_x + 195, form_y + 335),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+    # Title
+    cv2.putText(base_frame, "Sign In", (form_x + 180, form_y + 60),
+               cv2.FONT_HERSHEY_SIMPLEX, 1.2, (50, 50, 50), 2)
+
+    def draw_email_field(frame, color):
+        cv2.rectangle(frame, (form_x + 40, form_y + 120),
+                     (form_x + 440, form_y + 160), color, -1)
 
-        # Always show login button outline
-        if frame_num >= fps * 1:
+    def draw_password_field(frame, color):
+        cv2.rectangle(frame, (form_x + 40, form_y + 200),
+                     (form_x + 440, form_y + 240), color, -1)
+
+    def draw_placeholder(frame, text, y):
+        cv2.putText(frame, text, (form_x + 50, y),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (150, 150, 150), 1)
+
+    def draw_login_button(frame, fill_color=None):
+        if fill_color is not None:
             cv2.rectangle(frame, (form_x + 140, form_y + 300),
-                         (form_x + 340, form_y + 350), (70, 130, 180), 2)
+                         (form_x + 340, form_y + 350), fill_color, -1)
             cv2.putText(frame, "Login", (form_x + 195, form_y + 335),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
 
-        writer.write(frame)
+        # Login button outline, shown from the first second on
+        cv2.rectangle(frame, (form_x + 140, form_y + 300),
+                     (form_x + 340, form_y + 350), (70, 130, 180), 2)
+        cv2.putText(frame, "Login", (form_x + 195, form_y + 335),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+
+    # Each form state (input field backgrounds, placeholders, finished values and
+    # the login button) is prerendered over the base frame; per frame only the
+    # text being typed is blitted in
+    empty_form = base_frame.copy()  # First second: empty form
+    draw_email_field(empty_form, (220, 220, 220))
+    draw_placeholder(empty_form, "Email", form_y + 145)
+    draw_password_field(empty_form, (220, 220, 220))
+    draw_placeholder(empty_form, "Password", form_y + 225)
+
+    typing_email = base_frame.copy()  # Second 1-2.5: typing email
+    draw_email_field(typing_email, (255, 255, 220))
+    draw_password_field(typing_email, (220, 220, 220))
+    draw_placeholder(typing_email, "Password", form_y + 225)
+    draw_login_button(typing_email)
+
+    typing_password = base_frame.copy()  # Second 2.5-4: typing password
+    draw_email_field(typing_password, (255, 255, 255))
+    cv2.putText(typing_password, "user@example.com", (form_x + 50, form_y + 145),
+               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1)
+    draw_password_field(typing_password, (255, 255, 220))
+    draw_login_button(typing_password)
+
+    filled_form = base_frame.copy()  # Second 4-5: clicking login button
+    draw_email_field(filled_form, (255, 255, 255))
+    cv2.putText(filled_form, "user@example.com", (form_x + 50, form_y + 145),
+               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1)
+    draw_password_field(filled_form, (255, 255, 255))
+    cv2.putText(filled_form, "••••••••", (form_x + 50, form_y + 225),
+               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 1)
+
+    # Login button (highlighted when clicking)
+    clicking_form = filled_form.copy()
+    draw_login_button(filled_form, (70, 130, 180))
+    draw_login_button(clicking_form, (100, 150, 250))
+
+    # Every prefix of the typed values, prerendered as tiles of the input field
+    # they are typed into, so no text is rasterized inside the frame loop
+    email_field = np.s_[form_y + 120:form_y + 161, form_x + 40:form_x + 441]
+    password_field = np.s_[form_y + 200:form_y + 241, form_x + 40:form_x + 441]
+
+    def text_tiles(background, field, texts, scale):
+        tiles = []
+        for text in texts:
+            tile = background[field].copy()
+            cv2.putText(tile, text, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), 1)
+            tiles.append(tile)
+        return tiles
+
+    email = "user@example.com"
+    email_tiles = text_tiles(typing_email, email_field,
+                             [email[:n] for n in range(len(email) + 1)], 0.6)
+    dot_tiles = text_tiles(typing_password, password_field,
+                           ["•" * n for n in range(9)], 0.8)
+
+    # One renderer per state, dispatched by the state index computed below; each
+    # copies the state's prerendered frame and blits the detail's tile, if any
+    def render_empty_form(frame, detail):  # First second: empty form
+        np.copyto(frame, empty_form)
+
+    def render_typing_email(frame, chars):  # Second 1-2.5: typing email
+        np.copyto(frame, typing_email)
+        frame[email_field] = email_tiles[chars]
+
+    def render_typing_password(frame, dots):  # Second 2.5-4: typing password
+        np.copyto(frame, typing_password)
+        frame[password_field] = dot_tiles[dots]
+
+    def render_clicking(frame, highlighted):  # Second 4-5: clicking login button
+        np.copyto(frame, clicking_form if highlighted else filled_form)
+
+    renderers = [render_empty_form, render_typing_email, render_typing_password, render_clicking]
+
+    # Which state each frame is in, and the state's animated detail (typed email
+    # length, password dot count, button highlight), computed for all frames at once.
+    # A frame whose state and detail match the previous frame is pixel-identical
+    # to it, so only the 27 distinct frames are rendered
+    frame_nums = np.arange(total_frames)
+    states = np.searchsorted([fps * 1, fps * 2.5, fps * 4], frame_nums, side='right')
+    details = np.select(
+        [states == 1, states == 2, states == 3],
+        [np.minimum(len(email), ((frame_nums - fps) / 3).astype(int)),
+         np.minimum(8, ((frame_nums - fps * 2.5) / 4).astype(int)),
+         frame_nums > fps * 4.5],
+        0
+    )
+    changed = np.ones(total_frames, dtype=bool)
+    changed[1:] = (states[1:] != states[:-1]) | (details[1:] != details[:-1])
+
+    # Create video writer, asking OpenCV's ffmpeg backend for a hardware encoder
+    # (NVENC, QSV, VAAPI, ...) when one is available; otherwise it encodes in software
+    output_file = str(output_path)
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    writer = cv2.VideoWriter(
+        output_file, cv2.CAP_FFMPEG, fourcc, fps, (width, height),
+        [cv2.VIDEOWRITER_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+    )
+    if not writer.isOpened():
+        writer = cv2.VideoWriter(output_file, fourcc, fps, (width, height))
+
+    if not writer.isOpened():
+        print(f"Error: Could not create video writer")
+        return False
+
+    print(f"Creating test video: {output_path}")
+
+    # Create frames with progressive changes. Rendering is far cheaper than encoding,
+    # so frames are rendered serially into one reused buffer rather than in worker
+    # processes (which would have to send every 2.7 MB frame back to the writer).
+    # The writer is released even if writing fails, so the encoder is not leaked.
+    frame = np.empty_like(base_frame)
+    try:
+        for frame_num in range(total_frames):
+            if changed[frame_num]:
+                renderers[states[frame_num]](frame, details[frame_num])
+            writer.write(frame)
+    finally:
+        writer.release()
 
-    writer.release()
     print(f"✅ Created test video: {output_path}")
     return True
 
@@ -131,7 +187,7 @@ def create_test_screenshot():
     width, height = 1280, 720
 
     # Create image (white background)
-    image = np.ones((height, width, 3), dtype=np.uint8) * 255
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
 
     # Header bar
     cv2.rectangle(image, (0, 0), (width, 80), (70, 130, 180), -1)
@@ -162,7 +218,9 @@ def create_test_screenshot():
     cv2.putText(image, "I agree to terms", (250, 422),
                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (50, 50, 50), 1)
 
-    cv2.imwrite(str(output_path), image)
+    # Light zlib compression: the fixture is regenerated from source, so CPU time
+    # matters more than a few extra KB on disk (PNG stays lossless either way)
+    cv2.imwrite(str(output_path), image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
     print(f"✅ Created test screenshot: {output_path}")
     return True
 
@@ -1,10 +1,91 @@
 """Unit tests for ClaudeAnalyzer."""
 import pytest
-import os
+import asyncio
+import json
+import re
+from typing import Any, ClassVar, Dict, List
+from claude_agent_sdk import AssistantMessage, TextBlock, ResultMessage
 from video_analyzer import ClaudeAnalyzer
 from video_analyzer.models import FrameAnalysis
 
 
+class FakeSDKClient:
+    """Stand-in for ClaudeSDKClient that answers every query with a canned frame analysis."""
+
+    in_flight = 0
+    max_in_flight = 0
+    prompts: ClassVar[List[str]] = []
+    images: ClassVar[List[Dict[str, Any]]] = []
+    output_caps: ClassVar[List[int]] = []  # CLAUDE_CODE_MAX_OUTPUT_TOKENS of the client each prompt went to
+    rate_limited = 0  # number of upcoming replies that report a rate limit
+    malformed = 0  # number of upcoming replies that are not JSON
+
+    def __init__(self, options=None):
+        self.options = options
+        self.prompt = None
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def query(self, prompt):
+        if not isinstance(prompt, str):
+            # Streamed message: record text and image blocks separately
+            blocks = [b async for m in prompt for b in m["message"]["content"]]
+            FakeSDKClient.images.extend(b for b in blocks if b["type"] == "image")
+            prompt = "\n".join(b["text"] for b in blocks if b["type"] == "text")
+        self.prompt = prompt
+        FakeSDKClient.prompts.append(prompt)
+        FakeSDKClient.output_caps.append(int(self.options.env["CLAUDE_CODE_MAX_OUTPUT_TOKENS"]))
+        FakeSDKClient.in_flight += 1
+        FakeSDKClient.max_in_flight = max(FakeSDKClient.max_in_flight, FakeSDKClient.in_flight)
+
+    async def receive_response(self):
+        await asyncio.sleep(0.01)
+        FakeSDKClient.in_flight -= 1
+        if FakeSDKClient.rate_limited:
+            FakeSDKClient.rate_limited -= 1
+            yield AssistantMessage(content=[TextBlock(text="Rate limited")], model="fake", error="rate_limit")
+            yield ResultMessage(
+                subtype="success", duration_ms=0, duration_api_ms=0,
+                is_error=True, num_turns=1, session_id="fake"
+            )
+            return
+        if FakeSDKClient.malformed:
+            FakeSDKClient.malformed -= 1
+            yield AssistantMessage(content=[TextBlock(text="I cannot tell")], model="fake")
+            yield ResultMessage(
+                subtype="success", duration_ms=0, duration_api_ms=0,
+                is_error=False, num_turns=1, session_id="fake"
+            )
+            return
+        item = {"action_type": "click", "description": "Click button"}
+        batch = re.search(r"JSON array of exactly (\d+) objects", self.prompt)
+        text = json.dumps([item] * int(batch.group(1)) if batch else item)
+        yield AssistantMessage(content=[TextBlock(text=text)], model="fake")
+        yield ResultMessage(
+            subtype="success", duration_ms=0, duration_api_ms=0,
+            is_error=False, num_turns=1, session_id="fake"
+        )
+
+
+@pytest.fixture
+def fake_sdk_client(monkeypatch):
+    """Patch the analyzer to use FakeSDKClient instead of the real Agent SDK."""
+    FakeSDKClient.in_flight = 0
+    FakeSDKClient.max_in_flight = 0
+    FakeSDKClient.prompts = []
+    FakeSDKClient.images = []
+    FakeSDKClient.output_caps = []
+    FakeSDKClient.rate_limited = 0
+    FakeSDKClient.malformed = 0
+    monkeypatch.setattr("video_analyzer.claude_analyzer.RETRY_BASE_DELAY", 0)
+    monkeypatch.setattr("video_analyzer.claude_analyzer.ClaudeSDKClient", FakeSDKClient)
+    return FakeSDKClient
+
+
 @pytest.mark.asyncio
 class TestClaudeAnalyzer:
     """Test ClaudeAnalyzer frame analysis."""
@@ -15,7 +96,8 @@ class TestClaudeAnalyzer:
 
         # Client is lazily initialized
         assert analyzer.client is None
-        assert analyzer.model == "sonnet"
+        assert analyzer.frame_model == "haiku"
+        assert analyzer.summary_model == "sonnet"
 
         # After ensuring client, it should be initialized
         await analyzer._ensure_client()
@@ -24,25 +106,191 @@ class TestClaudeAnalyzer:
         # Cleanup
         await analyzer._cleanup()
 
-    @pytest.mark.integration
-    async def test_analyze_frame_basic(self, sample_screenshot_path):
-        """Test basic frame analysis (integration test)."""
-        # Skip if no API key (Claude Code provides this automatically)
-        if not os.environ.get("ANTHROPIC_API_KEY"):
-            pytest.skip("ANTHROPIC_API_KEY not set (automatically provided in Claude Code)")
+    async def test_concurrent_analysis_bounded_by_pool(self, fake_sdk_client, dummy_frame_base64):
+        """Test concurrent analyses never exceed max_concurrency clients."""
+        analyzer = ClaudeAnalyzer(max_concurrency=3)
+
+        results = await asyncio.gather(*(
+            analyzer.analyze_frame(dummy_frame_base64, i * 1000) for i in range(10)
+        ))
+
+        assert [r.timestamp for r in results] == [i * 1000 for i in range(10)]
+        assert all(r.action_type == "click" for r in results)
+        assert fake_sdk_client.max_in_flight == 3
+        assert len(analyzer._clients) == 3
+
+        await analyzer._cleanup()
+
+    async def test_static_instructions_in_system_prompt(self, fake_sdk_client, dummy_frame_base64):
+        """Test the JSON format is sent once as system prompt, not with every frame."""
+        from video_analyzer.claude_analyzer import FRAME_SYSTEM_PROMPT, FRAME_JSON_FORMAT
+
+        analyzer = ClaudeAnalyzer()
+
+        await analyzer.analyze_frame(dummy_frame_base64, 0)
+
+        assert analyzer.client.options.system_prompt == FRAME_SYSTEM_PROMPT
+        assert analyzer.client.options.tools == []
+        assert FRAME_JSON_FORMAT not in fake_sdk_client.prompts[0]
+
+        await analyzer._cleanup()
+
+    async def test_analyze_frames_batch(self, fake_sdk_client, dummy_frame_base64):
+        """Test several frames are analyzed with a single request."""
+        analyzer = ClaudeAnalyzer()
+        frames = [(i * 500, dummy_frame_base64) for i in range(4)]
+
+        results = await analyzer.analyze_frames_batch(frames)
+
+        assert len(fake_sdk_client.prompts) == 1
+        assert len(fake_sdk_client.images) == 4
+        assert fake_sdk_client.images[0]["source"]["data"] == dummy_frame_base64
+        assert [r.timestamp for r in results] == [0, 500, 1000, 1500]
+        assert all(r.action_type == "click" for r in results)
+
+        await analyzer._cleanup()
+
+    async def test_clients_reused_until_closed(self, fake_sdk_client, dummy_frame_base64, sample_analyses):
+        """Test clients survive a full run and are only disconnected by close()."""
+        async with ClaudeAnalyzer() as analyzer:
+            await analyzer.analyze_frame(dummy_frame_base64, 0)
+            client = analyzer.client
+            await analyzer.generate_workflow_summary(sample_analyses)
+
+            # A second run reuses the connected client
+            await analyzer.analyze_frame(dummy_frame_base64, 1000)
+            assert analyzer.client is client
+            assert analyzer.summary_client is not None
+
+        assert analyzer.client is None
+        assert analyzer.summary_client is None
+
+    async def test_models_and_output_caps(self, fake_sdk_client, dummy_frame_base64, sample_analyses):
+        """Test frames and summary use their own model and output token cap."""
+        from video_analyzer.claude_analyzer import FRAME_MAX_TOKENS, SUMMARY_MAX_TOKENS
+
+        analyzer = ClaudeAnalyzer(max_batch_size=2)
+
+        results = await analyzer.analyze_frames_batch([(i * 500, dummy_frame_base64) for i in range(5)])
+        await analyzer.generate_workflow_summary(sample_analyses)
+
+        # Batches above max_batch_size are split: 2 + 2 + 1 frames, then the summary;
+        # every frame request shares the one frame client and its cap
+        assert [r.timestamp for r in results] == [0, 500, 1000, 1500, 2000]
+        assert len(fake_sdk_client.prompts) == 4
+        assert fake_sdk_client.output_caps == [
+            FRAME_MAX_TOKENS * 2, FRAME_MAX_TOKENS * 2, FRAME_MAX_TOKENS * 2, SUMMARY_MAX_TOKENS
+        ]
+        assert len(analyzer._clients) == 1
 
+        frame_options = analyzer.client.options
+        assert frame_options.model == "haiku"
+        assert frame_options.env["CLAUDE_CODE_MAX_OUTPUT_TOKENS"] == str(FRAME_MAX_TOKENS * 2)
+
+        summary_options = analyzer.summary_client.options
+        assert summary_options.model == "sonnet"
+        assert summary_options.env["CLAUDE_CODE_MAX_OUTPUT_TOKENS"] == str(SUMMARY_MAX_TOKENS)
+
+        await analyzer.close()
+
+    async def test_rate_limited_requests_are_retried(self, fake_sdk_client, dummy_frame):
+        """Test rate-limited replies are retried instead of failing the frame."""
+        from video_analyzer import VideoProcessor
+        from video_analyzer.claude_analyzer import MAX_RETRIES
+
+        analyzer = ClaudeAnalyzer()
+        frame_base64 = VideoProcessor().frame_to_base64(dummy_frame)
+
+        fake_sdk_client.rate_limited = 2
+        result = await analyzer.analyze_frame(frame_base64, 0)
+        assert result.action_type == "click"
+        assert len(fake_sdk_client.prompts) == 3
+
+        # Gives up (gracefully) once retries are exhausted; a different screenshot,
+        # since the first one's analysis is now cached
+        fake_sdk_client.rate_limited = MAX_RETRIES + 1
+        result = await analyzer.analyze_frame(VideoProcessor().frame_to_base64(dummy_frame + 1), 1000)
+        assert result.action_type == "unknown"
+        assert "rate_limit" in result.description
+
+        await analyzer.close()
+
+    async def test_batch_failures(self, fake_sdk_client, dummy_frame):
+        """Test malformed batch replies fall back to single frames, but exhausted retries do not."""
         from video_analyzer import VideoProcessor
+        from video_analyzer.claude_analyzer import MAX_RETRIES
 
         analyzer = ClaudeAnalyzer()
         processor = VideoProcessor()
+        frames = [(i * 500, processor.frame_to_base64(dummy_frame + i)) for i in range(3)]
+
+        fake_sdk_client.malformed = 1
+        results = await analyzer.analyze_frames_batch(frames)
+        assert [r.action_type for r in results] == ["click"] * 3
+        assert len(fake_sdk_client.prompts) == 1 + 3
+
+        # Every frame fails with the batch instead of being retried one by one
+        fake_sdk_client.prompts.clear()
+        fake_sdk_client.rate_limited = MAX_RETRIES + 1
+        frames = [(i * 500, processor.frame_to_base64(dummy_frame + 10 + i)) for i in range(3)]
+        results = await analyzer.analyze_frames_batch(frames)
+        assert [r.timestamp for r in results] == [0, 500, 1000]
+        assert all(r.action_type == "unknown" and "rate_limit" in r.description for r in results)
+        assert len(fake_sdk_client.prompts) == MAX_RETRIES + 1
+
+        await analyzer.close()
+
+    async def test_repeated_screenshot_is_not_reanalyzed(self, fake_sdk_client, dummy_frame_base64):
+        """Test an identical screenshot reuses the earlier analysis, whatever the context."""
+        analyzer = ClaudeAnalyzer()
+
+        first = await analyzer.analyze_frame(dummy_frame_base64, 0)
+        repeat = await analyzer.analyze_frame(dummy_frame_base64, 1000)
+        assert len(fake_sdk_client.prompts) == 1
+        assert repeat.timestamp == 1000
+        assert repeat.description == first.description
+
+        # Context changes after every frame, so it is not part of the key
+        await analyzer.analyze_frame(dummy_frame_base64, 2000, [first])
+        assert len(fake_sdk_client.prompts) == 1
 
-        # Load screenshot
-        import cv2
-        frame = cv2.imread(sample_screenshot_path)
-        frame_base64 = processor.frame_to_base64(frame)
+        await analyzer.close()
+
+    async def test_parse_json_ignores_fences_and_prose(self):
+        """Test JSON replies are parsed from markdown fences and surrounding text."""
+        analyzer = ClaudeAnalyzer()
+
+        fenced = 'Here you go:\n```json\n{"action_type": "click", "note": "a } brace"}\n```\nDone.'
+        assert analyzer._parse_json(fenced) == {"action_type": "click", "note": "a } brace"}
+
+        prose = 'Result: [{"action_type": "type"}] (one item) {not json}'
+        assert analyzer._parse_json(prose, "[") == [{"action_type": "type"}]
+
+        with pytest.raises(ValueError):
+            analyzer._parse_json("no json here")
+
+    async def test_analyses_are_immutable(self, fake_sdk_client, dummy_frame_base64):
+        """Test frame analyses, including fallbacks, cannot be modified after creation."""
+        from pydantic import ValidationError
+
+        analyzer = ClaudeAnalyzer()
+        result = await analyzer.analyze_frame(dummy_frame_base64, 1000)
+        failed = analyzer._failed_analysis(2000, RuntimeError("boom"))
+
+        for analysis in (result, failed):
+            with pytest.raises(ValidationError):
+                analysis.timestamp = 0
+        assert failed.description == "Analysis failed: boom"
+
+        await analyzer.close()
+
+    @pytest.mark.integration
+    async def test_analyze_frame_basic(self, sample_screenshot_base64):
+        """Test basic frame analysis (integration test)."""
+        analyzer = ClaudeAnalyzer()
 
         # Analyze
-        result = await analyzer.analyze_frame(frame_base64, 0)
+        result = await analyzer.analyze_frame(sample_screenshot_base64, 0)
 
         # Should return FrameAnalysis
         assert isinstance(result, FrameAnalysis)
@@ -51,20 +299,9 @@ class TestClaudeAnalyzer:
         assert result.description
 
     @pytest.mark.integration
-    async def test_analyze_frame_with_context(self, sample_screenshot_path):
+    async def test_analyze_frame_with_context(self, sample_screenshot_base64):
         """Test frame analysis with previous context."""
-        # Skip if no API key (Claude Code provides this automatically)
-        if not os.environ.get("ANTHROPIC_API_KEY"):
-            pytest.skip("ANTHROPIC_API_KEY not set (automatically provided in Claude Code)")
-
-        from video_analyzer import VideoProcessor
-
         analyzer = ClaudeAnalyzer()
-        processor = VideoProcessor()
-
-        import cv2
-        frame = cv2.imread(sample_screenshot_path)
-        frame_base64 = processor.frame_to_base64(frame)
 
         # Create context
         context = [
@@ -76,7 +313,7 @@ class TestClaudeAnalyzer:
         ]
 
         # Analyze with context
-        result = await analyzer.analyze_frame(frame_base64, 1000, context)
+        result = await analyzer.analyze_frame(sample_screenshot_base64, 1000, context)
 
         assert isinstance(result, FrameAnalysis)
         assert result.timestamp == 1000
@@ -84,13 +321,10 @@ class TestClaudeAnalyzer:
     @pytest.mark.integration
     async def test_generate_workflow_summary(self, sample_analyses):
         """Test workflow summary generation."""
-        # Skip if no API key (Claude Code provides this automatically)
-        if not os.environ.get("ANTHROPIC_API_KEY"):
-            pytest.skip("ANTHROPIC_API_KEY not set (automatically provided in Claude Code)")
-
         analyzer = ClaudeAnalyzer()
 
         summary = await analyzer.generate_workflow_summary(sample_analyses)
+        await analyzer.close()
 
         assert isinstance(summary, str)
         assert len(summary) > 0
@@ -1,16 +1,72 @@
 """Integration tests for generated script syntax validation."""
 import pytest
-import py_compile
+import shutil
 import subprocess
-import tempfile
-from pathlib import Path
 from video_analyzer import ScriptGenerator
 from video_analyzer.models import FrameAnalysis, TargetElement
 
 
-@pytest.fixture
+# Probed once at import, without spawning a process
+NODE_AVAILABLE = shutil.which('node') is not None
+requires_node = pytest.mark.skipif(not NODE_AVAILABLE, reason="Node.js not installed")
+
+
+def assert_valid_python(script):
+    """Compile the script in memory; raises SyntaxError if it is invalid."""
+    compile(script, "<generated>", "exec")
+
+
+# Reads length-prefixed scripts from stdin and compiles each without running it,
+# answering one "OK" or "ERR:<message>" line per script
+NODE_SYNTAX_SERVER = r"""
+const vm = require('vm');
+let pending = Buffer.alloc(0);
+process.stdin.on('data', (chunk) => {
+  pending = Buffer.concat([pending, chunk]);
+  while (pending.length >= 4) {
+    const length = pending.readUInt32BE(0);
+    if (pending.length < 4 + length) break;
+    const source = pending.subarray(4, 4 + length).toString('utf8');
+    pending = pending.subarray(4 + length);
+    try {
+      new vm.Script(source);
+      process.stdout.write('OK\n');
+    } catch (error) {
+      process.stdout.write('ERR:' + String(error.message).replace(/\n/g, ' ') + '\n');
+    }
+  }
+});
+"""
+
+
+@pytest.fixture(scope="session")
+def assert_valid_javascript():
+    """Syntax-check scripts with one Node.js process shared by the whole session."""
+    server = subprocess.Popen(
+        ['node', '-e', NODE_SYNTAX_SERVER],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE
+    )
+
+    def check(script):
+        source = script.encode()
+        server.stdin.write(len(source).to_bytes(4, 'big') + source)
+        server.stdin.flush()
+        response = server.stdout.readline().decode().rstrip('\n')
+        assert response == 'OK', f"JavaScript syntax error: {response}"
+
+    yield check
+
+    server.stdin.close()
+    try:
+        server.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+@pytest.fixture(scope="module")
 def sample_analyses_with_special_chars():
-    """Create sample analyses with special characters in selectors."""
+    """Sample analyses with special characters in selectors (frozen models, shared by the module)."""
     return [
         FrameAnalysis(
             timestamp=0,
@@ -75,9 +131,9 @@ def sample_analyses_with_special_chars():
     ]
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def mixed_desktop_web_analyses():
-    """Create analyses with both desktop and web operations."""
+    """Analyses with both desktop and web operations (frozen models, shared by the module)."""
     return [
         FrameAnalysis(
             timestamp=0,
@@ -127,41 +183,23 @@ def mixed_desktop_web_analyses():
 class TestSeleniumSyntaxValidation:
     """Test Selenium script generation and syntax validation."""
 
-    def test_selenium_basic_syntax(self, sample_analyses):
+    def test_selenium_basic_syntax(self, sample_analyses, script_generator_no_validate):
         """Test that basic Selenium script has valid Python syntax."""
-        generator = ScriptGenerator(validate_syntax=False)  # Manual validation
-        script = generator.generate_selenium(sample_analyses, "test_workflow")
-
-        # Validate syntax using py_compile
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as f:
-            f.write(script)
-            temp_path = f.name
+        script = script_generator_no_validate.generate_selenium(sample_analyses, "test_workflow")
 
-        try:
-            # Should compile without errors
-            py_compile.compile(temp_path, doraise=True)
-        finally:
-            Path(temp_path).unlink(missing_ok=True)
+        # Validate syntax
+        assert_valid_python(script)
 
-    def test_selenium_special_chars_syntax(self, sample_analyses_with_special_chars):
+    def test_selenium_special_chars_syntax(self, sample_analyses_with_special_chars, script_generator_no_validate):
         """Test Selenium script with special characters in selectors."""
-        generator = ScriptGenerator(validate_syntax=False)
-        script = generator.generate_selenium(sample_analyses_with_special_chars, "special_chars")
+        script = script_generator_no_validate.generate_selenium(sample_analyses_with_special_chars, "special_chars")
 
         # Validate syntax
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as f:
-            f.write(script)
-            temp_path = f.name
-
-        try:
-            py_compile.compile(temp_path, doraise=True)
-        finally:
-            Path(temp_path).unlink(missing_ok=True)
+        assert_valid_python(script)
 
-    def test_selenium_quote_escaping(self, sample_analyses_with_special_chars):
+    def test_selenium_quote_escaping(self, sample_analyses_with_special_chars, script_generator):
         """Test that quotes in selectors are properly escaped."""
-        generator = ScriptGenerator()
-        script = generator.generate_selenium(sample_analyses_with_special_chars, "quotes")
+        script = script_generator.generate_selenium(sample_analyses_with_special_chars, "quotes")
 
         # Should not contain syntax error patterns
         assert "find_element(By.CSS_SELECTOR, 'input[ng-reflect-name='labelEmail']')" not in script
@@ -175,60 +213,26 @@ class TestSeleniumSyntaxValidation:
 class TestPlaywrightSyntaxValidation:
     """Test Playwright script generation and syntax validation."""
 
-    @pytest.mark.skipif(
-        subprocess.run(['which', 'node'], capture_output=True).returncode != 0,
-        reason="Node.js not installed"
-    )
-    def test_playwright_basic_syntax(self, sample_analyses):
+    @requires_node
+    def test_playwright_basic_syntax(self, sample_analyses, script_generator_no_validate, assert_valid_javascript):
         """Test that basic Playwright script has valid JavaScript syntax."""
-        generator = ScriptGenerator(validate_syntax=False)
-        script = generator.generate_playwright(sample_analyses, "test_workflow")
+        script = script_generator_no_validate.generate_playwright(sample_analyses, "test_workflow")
 
         # Validate syntax using Node.js
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.js', delete=False, encoding='utf-8') as f:
-            f.write(script)
-            temp_path = f.name
-
-        try:
-            result = subprocess.run(
-                ['node', '--check', temp_path],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            assert result.returncode == 0, f"JavaScript syntax error: {result.stderr}"
-        finally:
-            Path(temp_path).unlink(missing_ok=True)
-
-    @pytest.mark.skipif(
-        subprocess.run(['which', 'node'], capture_output=True).returncode != 0,
-        reason="Node.js not installed"
-    )
-    def test_playwright_special_chars_syntax(self, sample_analyses_with_special_chars):
+        assert_valid_javascript(script)
+
+    @requires_node
+    def test_playwright_special_chars_syntax(self, sample_analyses_with_special_chars, script_generator_no_validate,
+                                             assert_valid_javascript):
         """Test Playwright script with special characters."""
-        generator = ScriptGenerator(validate_syntax=False)
-        script = generator.generate_playwright(sample_analyses_with_special_chars, "special_chars")
+        script = script_generator_no_validate.generate_playwright(sample_analyses_with_special_chars, "special_chars")
 
         # Validate syntax
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.js', delete=False, encoding='utf-8') as f:
-            f.write(script)
-            temp_path = f.name
-
-        try:
-            result = subprocess.run(
-                ['node', '--check', temp_path],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            assert result.returncode == 0, f"JavaScript syntax error: {result.stderr}"
-        finally:
-            Path(temp_path).unlink(missing_ok=True)
-
-    def test_playwright_quote_handling(self, sample_analyses_with_special_chars):
+        assert_valid_javascript(script)
+
+    def test_playwright_quote_handling(self, sample_analyses_with_special_chars, script_generator):
         """Test that quotes are properly handled with backticks."""
-        generator = ScriptGenerator()
-        script = generator.generate_playwright(sample_analyses_with_special_chars, "quotes")
+        script = script_generator.generate_playwright(sample_analyses_with_special_chars, "quotes")
 
         # Should use backticks (template literals)
         assert "page.click(`" in script or "page.fill(`" in script
@@ -238,10 +242,9 @@ class TestPlaywrightSyntaxValidation:
 class TestWebOnlyFiltering:
     """Test web-only action filtering functionality."""
 
-    def test_web_only_filters_desktop_actions(self, mixed_desktop_web_analyses):
+    def test_web_only_filters_desktop_actions(self, mixed_desktop_web_analyses, script_generator):
         """Test that desktop actions are filtered out."""
-        generator = ScriptGenerator(web_only=True)
-        script = generator.generate_selenium(mixed_desktop_web_analyses, "mixed")
+        script = script_generator.generate_selenium(mixed_desktop_web_analyses, "mixed")
 
         # Should contain note about skipped actions
         assert "desktop operation(s) skipped" in script
@@ -254,10 +257,9 @@ class TestWebOnlyFiltering:
         assert "https://example.com" in script
         assert "button.submit" in script
 
-    def test_web_only_disabled_includes_all(self, mixed_desktop_web_analyses):
+    def test_web_only_disabled_includes_all(self, mixed_desktop_web_analyses, script_generator_all_actions):
         """Test that all actions are included when web_only=False."""
-        generator = ScriptGenerator(web_only=False)
-        script = generator.generate_selenium(mixed_desktop_web_analyses, "all")
+        script = script_generator_all_actions.generate_selenium(mixed_desktop_web_analyses, "all")
 
         # Should not contain filter note
         assert "skipped" not in script
@@ -265,20 +267,12 @@ class TestWebOnlyFiltering:
         # Should contain both desktop and web actions
         assert "Windows" in script or len(script) > 0  # Contains all actions
 
-    def test_filtered_script_valid_syntax(self, mixed_desktop_web_analyses):
+    def test_filtered_script_valid_syntax(self, mixed_desktop_web_analyses, script_generator_no_validate):
         """Test that filtered script has valid syntax."""
-        generator = ScriptGenerator(web_only=True, validate_syntax=False)
-        script = generator.generate_selenium(mixed_desktop_web_analyses, "filtered")
+        script = script_generator_no_validate.generate_selenium(mixed_desktop_web_analyses, "filtered")
 
         # Validate syntax
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as f:
-            f.write(script)
-            temp_path = f.name
-
-        try:
-            py_compile.compile(temp_path, doraise=True)
-        finally:
-            Path(temp_path).unlink(missing_ok=True)
+        assert_valid_python(script)
 
 
 class TestSyntaxValidationIntegration:
@@ -294,14 +288,13 @@ class TestSyntaxValidationIntegration:
         generator = ScriptGenerator(validate_syntax=False)
         assert generator.validate_syntax is False
 
-    def test_validation_catches_errors(self, sample_analyses_with_special_chars):
+    def test_validation_catches_errors(self, sample_analyses_with_special_chars, script_generator):
         """Test that validation catches syntax errors (if any were introduced)."""
         # This test verifies the validation mechanism works
-        generator = ScriptGenerator(validate_syntax=True)
 
         # Generate scripts - validation happens internally
-        selenium_script = generator.generate_selenium(sample_analyses_with_special_chars, "test")
-        playwright_script = generator.generate_playwright(sample_analyses_with_special_chars, "test")
+        selenium_script = script_generator.generate_selenium(sample_analyses_with_special_chars, "test")
+        playwright_script = script_generator.generate_playwright(sample_analyses_with_special_chars, "test")
 
         # Scripts should be generated (validation warnings logged, not raised)
         assert len(selenium_script) > 0
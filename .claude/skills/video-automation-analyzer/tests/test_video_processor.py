@@ -1,4 +1,8 @@
 """Unit tests for VideoProcessor."""
+import gc
+import shutil
+import subprocess
+import weakref
 import pytest
 from video_analyzer import VideoProcessor
 import numpy as np
@@ -35,6 +39,84 @@ class TestVideoProcessor:
             assert isinstance(frame, np.ndarray)
             assert frame.ndim == 3  # Height, width, channels
 
+    @pytest.mark.parametrize("backend", [
+        "opencv",
+        pytest.param("ffmpeg", marks=pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")),
+    ])
+    def test_iter_key_frames_streams(self, sample_video_path, backend):
+        """Test key frames are yielded one at a time without being retained."""
+        processor = VideoProcessor(fps_sample=2.0, min_change_threshold=0.01, backend=backend)
+        expected = [timestamp for timestamp, _ in processor.extract_key_frames(sample_video_path)]
+
+        timestamps = []
+        previous = None
+        for timestamp, frame in processor.iter_key_frames(sample_video_path):
+            # The previous key frame is freed once the caller lets go of it
+            gc.collect()
+            assert previous is None or previous() is None
+            timestamps.append(timestamp)
+            previous = weakref.ref(frame)
+            del frame
+
+        assert timestamps == expected
+
+    @pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+    @pytest.mark.parametrize("rotation", [0, 90])
+    def test_ffmpeg_backend_matches_opencv(self, sample_video_path, tmp_path, rotation):
+        """Test ffmpeg sampling finds the same key frames as OpenCV, including rotated videos."""
+        if rotation:
+            # Same stream with a display matrix, as phone recordings have
+            rotated_path = tmp_path / "rotated.mp4"
+            subprocess.run(
+                ["ffmpeg", "-loglevel", "error", "-display_rotation", str(rotation),
+                 "-i", sample_video_path, "-c", "copy", str(rotated_path)],
+                check=True
+            )
+            sample_video_path = str(rotated_path)
+
+        opencv = VideoProcessor(min_change_threshold=0.01, backend="opencv")
+        ffmpeg = VideoProcessor(min_change_threshold=0.01, backend="ffmpeg")
+
+        opencv_frames = opencv.extract_key_frames(sample_video_path)
+        ffmpeg_frames = ffmpeg.extract_key_frames(sample_video_path)
+
+        assert [t for t, _ in ffmpeg_frames] == [t for t, _ in opencv_frames]
+        for (_, ffmpeg_frame), (_, opencv_frame) in zip(ffmpeg_frames, opencv_frames):
+            assert ffmpeg_frame.shape == opencv_frame.shape
+            # Both decode the same pixels; only colour conversion rounding differs
+            assert np.abs(ffmpeg_frame.astype(np.int16) - opencv_frame).mean() < 2
+
+    @pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+    def test_keyframes_only(self, sample_video_path):
+        """Test keyframe-only decoding respects the sampling rate."""
+        processor = VideoProcessor(fps_sample=1.0, min_change_threshold=0.0, keyframes_only=True)
+        timestamps = [t for t, _ in processor.extract_key_frames(sample_video_path)]
+
+        assert timestamps[0] == 0
+        assert all(b - a >= 1000 for a, b in zip(timestamps, timestamps[1:]))
+
+    def test_keyframes_only_requires_ffmpeg_backend(self):
+        """Test keyframe-only decoding cannot be combined with OpenCV."""
+        with pytest.raises(ValueError, match="requires the ffmpeg backend"):
+            VideoProcessor(keyframes_only=True, backend="opencv")
+
+    def test_opencv_seek_matches_sequential_read(self, sample_video_path, monkeypatch):
+        """Test seeking between distant samples returns the same frames as grabbing."""
+        processor = VideoProcessor(fps_sample=0.5, min_change_threshold=0.0, backend="opencv")
+
+        monkeypatch.setattr("video_analyzer.video_processor.SEEK_MIN_INTERVAL", 1)
+        seeked = processor.extract_key_frames(sample_video_path)
+        monkeypatch.setattr("video_analyzer.video_processor.SEEK_MIN_INTERVAL", 10**9)
+        grabbed = processor.extract_key_frames(sample_video_path)
+
+        assert [t for t, _ in seeked] == [t for t, _ in grabbed]
+        assert all(np.array_equal(a, b) for (_, a), (_, b) in zip(seeked, grabbed))
+
+    def test_invalid_backend(self):
+        """Test unknown decoding backends are rejected."""
+        with pytest.raises(ValueError, match="Unknown frame decoding backend"):
+            VideoProcessor(backend="gstreamer")
+
     def test_frame_difference_calculation(self):
         """Test frame difference algorithm."""
         processor = VideoProcessor()
@@ -53,6 +135,14 @@ class TestVideoProcessor:
         diff = processor._calculate_frame_difference(frame1, frame2)
         assert diff > 0.9  # Should be close to 1.0
 
+        # Every changed pixel counts, unless faint changes (compression noise)
+        # are below the configured noise level
+        frame1 = np.full((720, 1280, 3), 128, dtype=np.uint8)
+        frame2 = frame1 + np.uint8(3)
+
+        assert processor._calculate_frame_difference(frame1, frame2) == 1.0
+        assert VideoProcessor(noise_level=8)._calculate_frame_difference(frame1, frame2) == 0.0
+
     def test_frame_to_base64(self, dummy_frame):
         """Test frame to base64 conversion."""
         processor = VideoProcessor()
@@ -67,6 +157,46 @@ class TestVideoProcessor:
         except Exception:
             pytest.fail("Invalid base64 encoding")
 
+    def test_frame_to_base64_downscales(self):
+        """Test frames are downscaled to max_image_dim before encoding."""
+        import base64
+        import cv2
+
+        processor = VideoProcessor(max_image_dim=640, jpeg_quality=75)
+        frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+
+        data = np.frombuffer(base64.b64decode(processor.frame_to_base64(frame)), np.uint8)
+        decoded = cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+        assert decoded.shape == (360, 640, 3)
+
+    def test_frame_hash_similarity(self):
+        """Test near-identical frames hash close together, different ones far apart."""
+        rng = np.random.default_rng(0)
+        frame = rng.integers(0, 256, (120, 160, 3), dtype=np.uint8)
+        noisy = frame.copy()
+        noisy[0, 0] = 255 - noisy[0, 0]
+        other = rng.integers(0, 256, (120, 160, 3), dtype=np.uint8)
+
+        h = VideoProcessor.frame_hash(frame)
+
+        assert (h ^ VideoProcessor.frame_hash(noisy)).bit_count() < 5
+        assert (h ^ VideoProcessor.frame_hash(other)).bit_count() >= 5
+
+    def test_dhash_change_metric(self, sample_video_path):
+        """Test perceptual-hash change detection keeps the first frame and screen changes."""
+        processor = VideoProcessor(fps_sample=2.0, min_change_threshold=0.01, change_metric="dhash")
+        frames = processor.extract_key_frames(sample_video_path)
+
+        assert frames[0][0] == 0
+        assert len(frames) >= 2
+
+        # Identical frames never count as a change
+        assert processor._hash_difference(123, 123) == 0.0
+
+        with pytest.raises(ValueError, match="Unknown frame change metric"):
+            VideoProcessor(change_metric="ssim")
+
     @pytest.mark.parametrize("fps,expected_min_frames", [
         (0.5, 1),   # Low sampling
         (1.0, 2),   # Standard